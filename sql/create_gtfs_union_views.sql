@@ -1,4 +1,7 @@
-﻿-- ROUTES (agency_id is missing in BUS feed; fill with NULL there)
+﻿-- The per-mode relations below (raw.gtfs_*_bus / raw.gtfs_*_fixed) are views over the
+-- current feed load (src/ingest/gtfs_store.py); `gtfs_store init` runs this file.
+
+-- ROUTES (agency_id is missing in BUS feed; fill with NULL there)
 CREATE OR REPLACE VIEW raw.gtfs_routes_all AS
 SELECT
   route_id::text                           AS route_id,
@@ -107,3 +110,48 @@ SELECT
   geom                                     AS geom,
   'fixed'::text                            AS mode
 FROM raw.gtfs_stops_geom_fixed;
+
+-- ===== Integer-keyed union views (filled by gtfs_load.build_keys) =====
+-- Keys are dense per feed, so every join also matches on mode; mode is a smallint
+-- decoded through raw.gtfs_mode.
+CREATE TABLE IF NOT EXISTS raw.gtfs_mode (
+  mode       smallint PRIMARY KEY,
+  mode_name  text NOT NULL UNIQUE
+);
+INSERT INTO raw.gtfs_mode (mode, mode_name) VALUES (1, 'bus'), (2, 'fixed')
+ON CONFLICT (mode) DO NOTHING;
+
+CREATE OR REPLACE VIEW raw.gtfs_trips_k_all AS
+SELECT 1::smallint AS mode, trip_key, route_key, service_key, direction_id FROM raw.gtfs_trips_k_bus
+UNION ALL
+SELECT 2::smallint AS mode, trip_key, route_key, service_key, direction_id FROM raw.gtfs_trips_k_fixed;
+
+CREATE OR REPLACE VIEW raw.gtfs_stop_times_k_all AS
+SELECT 1::smallint AS mode, trip_key, stop_sequence, stop_key, arrival_sec FROM raw.gtfs_stop_times_k_bus
+UNION ALL
+SELECT 2::smallint AS mode, trip_key, stop_sequence, stop_key, arrival_sec FROM raw.gtfs_stop_times_k_fixed;
+
+CREATE OR REPLACE VIEW raw.gtfs_stops_k_all AS
+SELECT 1::smallint AS mode, stop_key, stop_lon, stop_lat, geom FROM raw.gtfs_stops_k_bus
+UNION ALL
+SELECT 2::smallint AS mode, stop_key, stop_lon, stop_lat, geom FROM raw.gtfs_stops_k_fixed;
+
+CREATE OR REPLACE VIEW raw.gtfs_route_dict_all AS
+SELECT 1::smallint AS mode, route_key, route_id FROM raw.gtfs_route_dict_bus
+UNION ALL
+SELECT 2::smallint AS mode, route_key, route_id FROM raw.gtfs_route_dict_fixed;
+
+CREATE OR REPLACE VIEW raw.gtfs_trip_dict_all AS
+SELECT 1::smallint AS mode, trip_key, trip_id FROM raw.gtfs_trip_dict_bus
+UNION ALL
+SELECT 2::smallint AS mode, trip_key, trip_id FROM raw.gtfs_trip_dict_fixed;
+
+CREATE OR REPLACE VIEW raw.gtfs_stop_dict_all AS
+SELECT 1::smallint AS mode, stop_key, stop_id FROM raw.gtfs_stop_dict_bus
+UNION ALL
+SELECT 2::smallint AS mode, stop_key, stop_id FROM raw.gtfs_stop_dict_fixed;
+
+CREATE OR REPLACE VIEW raw.gtfs_service_dict_all AS
+SELECT 1::smallint AS mode, service_key, service_id FROM raw.gtfs_service_dict_bus
+UNION ALL
+SELECT 2::smallint AS mode, service_key, service_id FROM raw.gtfs_service_dict_fixed;
@@ -1,4 +1,5 @@
 ﻿-- sql/export_event_transport_summary_steps.sql
+-- Sequential reference version; python -m src.queries.event_summary runs the same steps concurrently.
 \timing on
 \pset format aligned
 \echo 'START export_event_transport_summary_steps.sql'
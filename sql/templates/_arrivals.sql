@@ -0,0 +1,26 @@
+-- Arrivals at region stops inside the window; GTFS hours >= 24 folded by % 86400.
+-- Integer keys throughout (arrival_sec is parsed at load time); families decode ids.
+-- inputs: {{stop_times}}, {{trips}}, {{stops_geom}}, meta.region
+WITH
+{{services}},
+rgn AS (
+  SELECT geom FROM meta.region WHERE iso_code = :iso
+),
+stops_region AS (
+  SELECT s.stop_key, s.mode
+  FROM {{stops_geom}} s, rgn
+  WHERE ST_Intersects(s.geom, rgn.geom)
+    {{mode_filter}}
+),
+stop_arrivals AS (
+  SELECT sod.d, st.mode, tr.route_key, st.stop_key, st.arrival_sec AS sec
+  FROM services_on_date sod
+  JOIN {{trips}} tr ON tr.service_key=sod.service_key AND tr.mode=sod.mode
+  JOIN {{stop_times}} st ON st.trip_key=tr.trip_key AND st.mode=tr.mode
+  JOIN stops_region sa ON sa.stop_key=st.stop_key AND sa.mode=st.mode
+),
+win AS (
+  SELECT d, mode, route_key, stop_key, sec
+  FROM stop_arrivals
+  WHERE sec IS NOT NULL AND (sec % 86400) BETWEEN :sec_start AND :sec_end - 1
+)
@@ -0,0 +1,15 @@
+headways AS (
+  SELECT d, mode, route_key, stop_key,
+         sec - lag(sec) OVER (PARTITION BY d, mode, route_key, stop_key ORDER BY sec) AS dh
+  FROM win
+),
+headways_pos AS (
+  SELECT d, mode, route_key, stop_key, dh
+  FROM headways WHERE dh IS NOT NULL AND dh > 0 AND dh <= 3600
+),
+route_day_median AS (
+  SELECT d, mode, route_key,
+         percentile_cont(0.5) WITHIN GROUP (ORDER BY dh::double precision) AS med_sec
+  FROM headways_pos
+  GROUP BY d, mode, route_key
+)
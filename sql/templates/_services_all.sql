@@ -0,0 +1,5 @@
+-- services_on_date for the unfiltered (T3 "all services") variant: one NULL day.
+services_on_date AS (
+  SELECT DISTINCT tr.mode, tr.service_key, NULL::date AS d
+  FROM {{trips}} tr
+)
@@ -0,0 +1,45 @@
+-- services_on_date(mode, service_key, d) for every requested date.
+-- Bus: calendar + calendar_dates overrides. Fixed (metro/tram) only exposes calendar_dates.
+-- inputs: {{calendar_bus}}, {{calendar_dates_bus}}, {{calendar_dates_fixed}}, {{service_dict}}, {{modes}}
+target AS (
+  SELECT d, to_char(d,'YYYYMMDD') AS dstr, EXTRACT(DOW FROM d)::int AS dow
+  FROM unnest(CAST(:dates AS date[])) AS u(d)
+),
+base_bus AS (
+  SELECT 'bus'::text AS mode, c.service_id::text AS service_id, t.d
+  FROM {{calendar_bus}} c
+  JOIN target t
+    ON t.d BETWEEN to_date(c.start_date,'YYYYMMDD') AND to_date(c.end_date,'YYYYMMDD')
+   AND ((t.dow=1 AND c.monday=1) OR (t.dow=2 AND c.tuesday=1) OR (t.dow=3 AND c.wednesday=1)
+     OR (t.dow=4 AND c.thursday=1) OR (t.dow=5 AND c.friday=1) OR (t.dow=6 AND c.saturday=1)
+     OR (t.dow=0 AND c.sunday=1))
+),
+incl_bus AS (
+  SELECT 'bus'::text AS mode, cd.service_id::text AS service_id, t.d
+  FROM {{calendar_dates_bus}} cd JOIN target t ON cd.date=t.dstr AND cd.exception_type=1
+),
+excl_bus AS (
+  SELECT 'bus'::text AS mode, cd.service_id::text AS service_id, t.d
+  FROM {{calendar_dates_bus}} cd JOIN target t ON cd.date=t.dstr AND cd.exception_type=2
+),
+services_bus AS (
+  SELECT DISTINCT * FROM (SELECT * FROM base_bus UNION ALL SELECT * FROM incl_bus) u
+  EXCEPT SELECT * FROM excl_bus
+),
+incl_fixed AS (
+  SELECT 'fixed'::text AS mode, cd.service_id::text AS service_id, t.d
+  FROM {{calendar_dates_fixed}} cd JOIN target t ON cd.date=t.dstr AND cd.exception_type=1
+),
+excl_fixed AS (
+  SELECT 'fixed'::text AS mode, cd.service_id::text AS service_id, t.d
+  FROM {{calendar_dates_fixed}} cd JOIN target t ON cd.date=t.dstr AND cd.exception_type=2
+),
+services_fixed AS (SELECT DISTINCT * FROM incl_fixed EXCEPT SELECT * FROM excl_fixed),
+services_on_date AS (
+  SELECT k.mode, k.service_key, x.d
+  FROM (SELECT mode, service_id, d FROM services_bus
+        UNION ALL
+        SELECT mode, service_id, d FROM services_fixed) x
+  JOIN {{modes}} m ON m.mode_name = x.mode
+  JOIN {{service_dict}} k ON k.mode = m.mode AND k.service_id = x.service_id
+)
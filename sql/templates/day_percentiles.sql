@@ -0,0 +1,12 @@
+-- Per-day distribution of route medians (replaces t3w_multi_percentiles.sql and
+-- t3w_multi_breakdown.sql: routes_with_median = routes, day_median_min = p50_min).
+{{> _arrivals}},
+{{> _route_day_median}}
+SELECT to_char(d,'YYYY-MM-DD') AS day,
+       COUNT(*) AS routes,
+       ROUND((percentile_cont(0.25) WITHIN GROUP (ORDER BY med_sec)/60.0)::numeric,2) AS p25_min,
+       ROUND((percentile_cont(0.50) WITHIN GROUP (ORDER BY med_sec)/60.0)::numeric,2) AS p50_min,
+       ROUND((percentile_cont(0.75) WITHIN GROUP (ORDER BY med_sec)/60.0)::numeric,2) AS p75_min
+FROM route_day_median
+GROUP BY d
+ORDER BY d
@@ -0,0 +1,12 @@
+-- First and last service date of the feed (calendar ranges and calendar_dates additions).
+-- inputs: {{calendar_bus}}, {{calendar_dates_bus}}, {{calendar_dates_fixed}}
+SELECT min(d) AS start_date, max(d) AS end_date
+FROM (
+  SELECT to_date(start_date,'YYYYMMDD') AS d FROM {{calendar_bus}}
+  UNION ALL
+  SELECT to_date(end_date,'YYYYMMDD') FROM {{calendar_bus}}
+  UNION ALL
+  SELECT to_date(date,'YYYYMMDD') FROM {{calendar_dates_bus}} WHERE exception_type=1
+  UNION ALL
+  SELECT to_date(date,'YYYYMMDD') FROM {{calendar_dates_fixed}} WHERE exception_type=1
+) u
@@ -0,0 +1,13 @@
+-- Network median headway: per-stop -> route median -> day network median -> median across days.
+-- With no dates this is the T3 value; with one date T3W; with several T3W_MULTI.
+{{> _arrivals}},
+{{> _route_day_median}},
+day_median AS (
+  SELECT d, percentile_cont(0.5) WITHIN GROUP (ORDER BY med_sec) AS day_med_sec
+  FROM route_day_median
+  GROUP BY d
+)
+SELECT ROUND(((percentile_cont(0.5) WITHIN GROUP (ORDER BY day_med_sec))/60.0)::numeric, 2) AS minutes,
+       COUNT(*) AS n_days
+FROM day_median
+WHERE day_med_sec IS NOT NULL
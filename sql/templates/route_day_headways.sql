@@ -0,0 +1,13 @@
+-- Headway histogram per day × route: every positive headway (0, 3600] s and how often
+-- it occurs. Exact route-day medians and the mergeable quantile sketches
+-- (src/queries/sketches.py) are both derived from it in one scan of stop_times.
+-- inputs: {{route_dict}}, {{modes}}
+{{> _arrivals}},
+{{> _route_day_median}}
+SELECT to_char(h.d,'YYYY-MM-DD') AS day, m.mode_name AS mode, coalesce(rd.route_id,'') AS route_id,
+       h.dh::int AS dh, COUNT(*) AS n
+FROM headways_pos h
+JOIN {{modes}} m ON m.mode=h.mode
+LEFT JOIN {{route_dict}} rd ON rd.mode=h.mode AND rd.route_key=h.route_key
+GROUP BY h.d, m.mode_name, rd.route_id, h.dh
+ORDER BY h.d, mode, route_id, dh
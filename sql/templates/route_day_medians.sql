@@ -0,0 +1,10 @@
+-- Per-day route median headway (one row per date × route); building block of the
+-- daily series. med_sec is left unrounded so day percentiles can be taken downstream.
+-- inputs: {{route_dict}}, {{modes}}
+{{> _arrivals}},
+{{> _route_day_median}}
+SELECT to_char(rdm.d,'YYYY-MM-DD') AS day, m.mode_name AS mode, rd.route_id, rdm.med_sec
+FROM route_day_median rdm
+JOIN {{modes}} m ON m.mode=rdm.mode
+LEFT JOIN {{route_dict}} rd ON rd.mode=rdm.mode AND rd.route_key=rdm.route_key
+ORDER BY rdm.d, mode, rd.route_id
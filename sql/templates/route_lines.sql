@@ -0,0 +1,27 @@
+-- Route polyline from the stop sequence of its longest trip (works for feeds without shapes.txt).
+-- inputs: {{stop_times}}, {{trips}}, {{stops_geom}}, {{route_dict}}, {{modes}}
+WITH trip_len AS (
+  SELECT st.mode, st.trip_key, COUNT(*) AS n
+  FROM {{stop_times}} st
+  GROUP BY st.mode, st.trip_key
+),
+rep AS (
+  SELECT DISTINCT ON (tr.mode, tr.route_key) tr.mode, tr.route_key, tr.trip_key
+  FROM {{trips}} tr
+  JOIN trip_len tl ON tl.trip_key=tr.trip_key AND tl.mode=tr.mode
+  ORDER BY tr.mode, tr.route_key, tl.n DESC, tr.trip_key
+),
+lines AS (
+  SELECT rep.mode, rep.route_key, ST_MakeLine(s.geom ORDER BY st.stop_sequence) AS geom
+  FROM rep
+  JOIN {{stop_times}} st ON st.trip_key=rep.trip_key AND st.mode=rep.mode
+  JOIN {{stops_geom}} s ON s.stop_key=st.stop_key AND s.mode=st.mode
+  WHERE TRUE {{mode_filter}}
+  GROUP BY rep.mode, rep.route_key
+)
+SELECT m.mode_name AS mode, rd.route_id, ST_AsGeoJSON(l.geom, 6) AS geometry
+FROM lines l
+JOIN {{modes}} m ON m.mode=l.mode
+LEFT JOIN {{route_dict}} rd ON rd.mode=l.mode AND rd.route_key=l.route_key
+WHERE ST_NPoints(l.geom) >= 2
+ORDER BY mode, rd.route_id
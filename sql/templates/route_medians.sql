@@ -0,0 +1,21 @@
+-- Per-route median headway for one window.
+-- Dated: per-day route median, then median across the days (T3W / T3W_MULTI).
+-- Undated: all services in one pass (T3).
+-- Replaces export_t3_route_medians_16_19*.sql, export_t3w_multi_route_medians_16_19*.sql.
+-- inputs: {{routes}}, {{route_dict}}, {{modes}}
+{{> _arrivals}},
+{{> _route_day_median}},
+route_median AS (
+  SELECT mode, route_key, percentile_cont(0.5) WITHIN GROUP (ORDER BY med_sec) AS med_sec
+  FROM route_day_median
+  GROUP BY mode, route_key
+)
+SELECT m.mode_name AS mode, rd.route_id,
+       coalesce(r.route_short_name,'') AS route_short_name,
+       coalesce(r.route_long_name,'')  AS route_long_name,
+       ROUND((rm.med_sec/60.0)::numeric,2) AS med_minutes
+FROM route_median rm
+JOIN {{modes}} m ON m.mode=rm.mode
+LEFT JOIN {{route_dict}} rd ON rd.mode=rm.mode AND rd.route_key=rm.route_key
+LEFT JOIN {{routes}} r ON r.route_id=rd.route_id AND r.mode=m.mode_name
+ORDER BY mode, med_minutes DESC
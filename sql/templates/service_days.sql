@@ -0,0 +1,9 @@
+-- Active (mode, service_id) for every requested date; calendar tables only, no stop_times.
+-- Services without trips have no key and are left out.
+WITH
+{{services}}
+SELECT to_char(sod.d,'YYYY-MM-DD') AS day, m.mode_name AS mode, k.service_id
+FROM services_on_date sod
+JOIN {{modes}} m ON m.mode=sod.mode
+JOIN {{service_dict}} k ON k.mode=sod.mode AND k.service_key=sod.service_key
+ORDER BY sod.d, mode, k.service_id
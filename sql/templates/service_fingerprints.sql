@@ -0,0 +1,19 @@
+-- Timetable fingerprint per (mode, service_id): an order-independent hash of the
+-- multiset of (route, stop, arrival) rows. Trip ids are left out, so a timetable
+-- re-issued under a new service_id for the next period gets the same fingerprint.
+-- Keys are per feed, so fingerprints compare services within one feed.
+-- inputs: {{trips}}, {{stop_times}}, {{service_dict}}, {{modes}}
+WITH fp AS (
+  SELECT tr.mode, tr.service_key,
+         md5(COUNT(*)::text || ':' ||
+             SUM(hashtextextended(coalesce(tr.route_key,0) || '|' || st.stop_key || '|'
+                                  || coalesce(st.arrival_sec,-1), 0)::numeric)::text) AS fingerprint
+  FROM {{trips}} tr
+  JOIN {{stop_times}} st ON st.trip_key=tr.trip_key AND st.mode=tr.mode
+  GROUP BY tr.mode, tr.service_key
+)
+SELECT m.mode_name AS mode, k.service_id, fp.fingerprint
+FROM fp
+JOIN {{modes}} m ON m.mode=fp.mode
+JOIN {{service_dict}} k ON k.mode=fp.mode AND k.service_key=fp.service_key
+ORDER BY mode, k.service_id
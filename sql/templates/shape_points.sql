@@ -0,0 +1,10 @@
+-- Bus shape points in EPSG:2100 (metres), in sequence order; input of the T2 transit matching.
+-- inputs: {{shapes_bus}}
+SELECT shape_id, shape_pt_sequence AS seq, ST_X(p) AS x, ST_Y(p) AS y
+FROM (
+  SELECT shape_id, shape_pt_sequence,
+         ST_Transform(ST_SetSRID(ST_MakePoint(shape_pt_lon, shape_pt_lat), 4326), 2100) AS p
+  FROM {{shapes_bus}}
+  WHERE shape_id IS NOT NULL AND shape_pt_lat IS NOT NULL AND shape_pt_lon IS NOT NULL
+) s
+ORDER BY shape_id, seq
@@ -0,0 +1,18 @@
+-- Scheduled bus trips per shape: mean trips per requested date, or every trip of the feed
+-- when no dates are given (T3 "all services").
+-- inputs: {{trips_bus}}, {{trips}}, {{service_dict}}, {{modes}}
+WITH
+{{services}},
+shape_trips AS (
+  SELECT t.shape_id
+  FROM services_on_date sod
+  JOIN {{modes}} m ON m.mode=sod.mode AND m.mode_name='bus'
+  JOIN {{service_dict}} k ON k.mode=sod.mode AND k.service_key=sod.service_key
+  JOIN {{trips_bus}} t ON t.service_id=k.service_id
+  WHERE t.shape_id IS NOT NULL
+)
+SELECT shape_id,
+       COUNT(*)::double precision / GREATEST(cardinality(CAST(:dates AS date[])), 1) AS trips
+FROM shape_trips
+GROUP BY shape_id
+ORDER BY shape_id
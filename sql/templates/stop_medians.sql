@@ -0,0 +1,21 @@
+-- Per-stop median headway across all routes serving the stop (t3w_stop_geojson_2024_11_20.sql).
+-- inputs: {{stop_dict}}, {{modes}}
+{{> _arrivals}},
+hw AS (
+  SELECT d, stop_key, mode,
+         sec - lag(sec) OVER (PARTITION BY d, stop_key, mode ORDER BY sec) AS dh
+  FROM win
+),
+stop_median AS (
+  SELECT stop_key, mode, percentile_cont(0.5) WITHIN GROUP (ORDER BY dh) AS med_sec
+  FROM hw
+  WHERE dh IS NOT NULL AND dh > 0 AND dh <= 3600
+  GROUP BY stop_key, mode
+)
+SELECT sd.stop_id, m.mode_name AS mode, (sm.med_sec/60.0) AS med_min,
+       ST_X(s.geom) AS lon, ST_Y(s.geom) AS lat
+FROM stop_median sm
+JOIN {{modes}} m ON m.mode=sm.mode
+JOIN {{stop_dict}} sd ON sd.stop_key=sm.stop_key AND sd.mode=sm.mode
+JOIN {{stops_geom}} s ON s.stop_key=sm.stop_key AND s.mode=sm.mode
+ORDER BY mode, sd.stop_id
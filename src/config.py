@@ -1,10 +1,11 @@
 ﻿import os
+from functools import lru_cache
 from dotenv import load_dotenv
 import sqlalchemy as sa
 
-def make_engine():
+def _db_url():
     load_dotenv()
-    url = sa.URL.create(
+    return sa.URL.create(
         "postgresql+psycopg2",
         username=os.getenv("DB_USER", "postgres"),
         password=os.getenv("DB_PASSWORD", "postgres"),
@@ -12,4 +13,20 @@ def make_engine():
         port=int(os.getenv("DB_PORT", "5432")),
         database=os.getenv("DB_NAME", "postgres"),
     )
-    return sa.create_engine(url, future=True)
+
+def make_engine():
+    return sa.create_engine(_db_url(), future=True)
+
+
+@lru_cache(maxsize=None)
+def get_engine():
+    """
+    Process-wide pooled engine. Use this for anything that issues many queries
+    (template runner, exporters, parallel workers) instead of a fresh make_engine().
+    """
+    return sa.create_engine(
+        _db_url(), future=True,
+        pool_size=int(os.getenv("DB_POOL_SIZE", "8")),
+        max_overflow=int(os.getenv("DB_POOL_OVERFLOW", "4")),
+        pool_pre_ping=True,
+    )
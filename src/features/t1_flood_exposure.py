@@ -0,0 +1,297 @@
+"""
+T1_EXPOSURE_FLOODPRONE_KM: share of road-km within BUFFER_M of waterways/coastline.
+
+Instead of buffering and intersecting the whole coastline and river polygons
+against the road network in one statement, the work is split up:
+
+- raw.osm_water is subdivided (ST_Subdivide) in a metric CRS and every part is
+  buffered once; raw.osm_roads is subdivided the same way. Parts are stored by
+  content hash (feat.t1_water_part / feat.t1_road_part).
+- The region is cut into a fixed grid of TILE_M tiles (feat.t1_tile), anchored
+  at the CRS origin, so tiles do not move between runs.
+- Each tile clips its road parts, unions the buffered water parts around it and
+  measures road length and exposed length (feat.t1_tile_result). Tiles run in
+  parallel on pooled connections.
+- The share is the exactly rounded sum (math.fsum) of the tile lengths, so it
+  does not depend on tile order or worker count.
+
+A refresh diffs the part hashes against the stored parts: only tiles touched by
+added or removed road/water parts are recomputed. Changing the buffer, tile size,
+CRS, region or region geometry rebuilds everything.
+
+Usage:
+  python -m src.features.t1_flood_exposure                 # incremental
+  python -m src.features.t1_flood_exposure --full --workers 8
+"""
+import math
+import time
+import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import sqlalchemy as sa
+from dotenv import load_dotenv
+
+from src.config import get_engine
+
+REGION_ISO = "EL30"
+IND_CODE = "T1_EXPOSURE_FLOODPRONE_KM"
+TIME_START = "2024-01-01"; TIME_END = "2024-12-31"
+
+SRID = 2100            # GGRS87 / Greek Grid (metres)
+BUFFER_M = 200.0
+TILE_M = 5_000
+MAX_VERTICES = 256     # ST_Subdivide target for water and road parts
+
+DDL = f"""
+CREATE TABLE IF NOT EXISTS feat.t1_config (
+  key text PRIMARY KEY, value text NOT NULL
+);
+CREATE TABLE IF NOT EXISTS feat.t1_road_part (
+  part_hash text PRIMARY KEY,
+  n         int NOT NULL,                       -- identical parts (duplicate ways) count n times
+  geom      geometry(Geometry, {SRID}) NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_t1_road_part_geom ON feat.t1_road_part USING GIST (geom);
+CREATE TABLE IF NOT EXISTS feat.t1_water_part (
+  part_hash text PRIMARY KEY,                   -- hash of the unbuffered part
+  geom      geometry(Geometry, {SRID}) NOT NULL -- buffered part
+);
+CREATE INDEX IF NOT EXISTS idx_t1_water_part_geom ON feat.t1_water_part USING GIST (geom);
+CREATE TABLE IF NOT EXISTS feat.t1_tile (
+  tile_id int PRIMARY KEY,
+  ix      int NOT NULL,
+  iy      int NOT NULL,
+  geom    geometry(Geometry, {SRID}) NOT NULL,
+  dirty   boolean NOT NULL DEFAULT true
+);
+CREATE INDEX IF NOT EXISTS idx_t1_tile_geom ON feat.t1_tile USING GIST (geom);
+CREATE TABLE IF NOT EXISTS feat.t1_tile_result (
+  tile_id     int PRIMARY KEY REFERENCES feat.t1_tile(tile_id) ON DELETE CASCADE,
+  road_m      double precision NOT NULL,
+  exposed_m   double precision NOT NULL,
+  computed_at timestamptz NOT NULL DEFAULT now()
+);
+"""
+
+TILES_SQL = f"""
+INSERT INTO feat.t1_tile (tile_id, ix, iy, geom)
+WITH rgn AS (
+  SELECT ST_Transform(geom, {SRID}) AS g FROM meta.region WHERE iso_code = %(iso)s
+),
+cells AS (
+  SELECT ix, iy, ST_MakeEnvelope(ix*%(s)s, iy*%(s)s, (ix+1)*%(s)s, (iy+1)*%(s)s, {SRID}) AS env
+  FROM rgn,
+       generate_series(floor(ST_XMin(g)/%(s)s)::int, floor(ST_XMax(g)/%(s)s)::int) ix,
+       generate_series(floor(ST_YMin(g)/%(s)s)::int, floor(ST_YMax(g)/%(s)s)::int) iy
+)
+SELECT row_number() OVER (ORDER BY iy, ix)::int, ix, iy, ST_Intersection(env, g)
+FROM cells, rgn
+WHERE ST_Intersects(env, g) AND NOT ST_IsEmpty(ST_Intersection(env, g));
+"""
+
+# New part sets as temp tables; {parts} is the part-producing query.
+_STAGE_SQL = """
+DROP TABLE IF EXISTS {tmp};
+CREATE TEMP TABLE {tmp} AS
+SELECT part_hash, count(*)::int AS n, (array_agg(geom))[1] AS geom
+FROM (SELECT md5(ST_AsEWKB(p)) AS part_hash, p AS geom FROM ({parts}) s(p)) h
+GROUP BY part_hash;
+CREATE INDEX ON {tmp} USING GIST (geom);
+CREATE INDEX ON {tmp} (part_hash);
+"""
+
+ROAD_PARTS = f"""
+  SELECT ST_Subdivide(ST_Transform(geom, {SRID}), {MAX_VERTICES})
+  FROM raw.osm_roads WHERE geom IS NOT NULL AND NOT ST_IsEmpty(geom)
+"""
+
+WATER_PARTS = f"""
+  SELECT ST_Subdivide(ST_MakeValid(ST_Transform(geom, {SRID})), {MAX_VERTICES})
+  FROM raw.osm_water WHERE geom IS NOT NULL AND NOT ST_IsEmpty(geom)
+"""
+
+# Tiles whose bbox meets a part that was added or removed become dirty; then the
+# stored parts are brought in line with the new set. Water parts are buffered here,
+# once per new part; the buffered geometry is what tiles are matched against.
+ROAD_DIFF_SQL = """
+UPDATE feat.t1_tile t SET dirty = true
+WHERE EXISTS (SELECT 1 FROM feat.t1_road_part o
+              WHERE o.geom && t.geom
+                AND NOT EXISTS (SELECT 1 FROM t1_road_new x WHERE x.part_hash = o.part_hash AND x.n = o.n))
+   OR EXISTS (SELECT 1 FROM t1_road_new x
+              WHERE x.geom && t.geom
+                AND NOT EXISTS (SELECT 1 FROM feat.t1_road_part o WHERE o.part_hash = x.part_hash AND o.n = x.n));
+DELETE FROM feat.t1_road_part o
+WHERE NOT EXISTS (SELECT 1 FROM t1_road_new x WHERE x.part_hash = o.part_hash AND x.n = o.n);
+INSERT INTO feat.t1_road_part (part_hash, n, geom)
+SELECT x.part_hash, x.n, x.geom FROM t1_road_new x
+WHERE NOT EXISTS (SELECT 1 FROM feat.t1_road_part o WHERE o.part_hash = x.part_hash);
+"""
+
+WATER_DIFF_SQL = f"""
+DROP TABLE IF EXISTS t1_water_added;
+CREATE TEMP TABLE t1_water_added AS
+SELECT x.part_hash, ST_Buffer(x.geom, {BUFFER_M}, 'quad_segs=8') AS geom
+FROM t1_water_new x
+WHERE NOT EXISTS (SELECT 1 FROM feat.t1_water_part o WHERE o.part_hash = x.part_hash);
+CREATE INDEX ON t1_water_added USING GIST (geom);
+UPDATE feat.t1_tile t SET dirty = true
+WHERE EXISTS (SELECT 1 FROM feat.t1_water_part o
+              WHERE o.geom && t.geom
+                AND NOT EXISTS (SELECT 1 FROM t1_water_new x WHERE x.part_hash = o.part_hash))
+   OR EXISTS (SELECT 1 FROM t1_water_added a WHERE a.geom && t.geom);
+DELETE FROM feat.t1_water_part o
+WHERE NOT EXISTS (SELECT 1 FROM t1_water_new x WHERE x.part_hash = o.part_hash);
+INSERT INTO feat.t1_water_part (part_hash, geom) SELECT part_hash, geom FROM t1_water_added;
+"""
+
+TILE_SQL = sa.text("""
+    WITH t AS (
+      SELECT geom, ST_Envelope(geom) AS env FROM feat.t1_tile WHERE tile_id = :tile
+    ),
+    roads AS (
+      SELECT ST_Intersection(r.geom, t.geom) AS geom, r.n
+      FROM feat.t1_road_part r, t
+      WHERE r.geom && t.geom AND ST_Intersects(r.geom, t.geom)
+    ),
+    zone AS (
+      SELECT ST_Union(ST_Intersection(w.geom, t.env)) AS geom
+      FROM feat.t1_water_part w, t
+      WHERE w.geom && t.geom AND ST_Intersects(w.geom, t.geom)
+    )
+    SELECT coalesce(sum(ST_Length(r.geom) * r.n), 0) AS road_m,
+           coalesce(sum(ST_Length(ST_Intersection(r.geom, z.geom)) * r.n)
+                    FILTER (WHERE z.geom IS NOT NULL), 0) AS exposed_m
+    FROM roads r CROSS JOIN zone z
+""")
+
+UPSERT_SQL = sa.text("""
+    INSERT INTO feat.t1_tile_result (tile_id, road_m, exposed_m, computed_at)
+    VALUES (:tile, :road_m, :exposed_m, now())
+    ON CONFLICT (tile_id) DO UPDATE
+      SET road_m = EXCLUDED.road_m, exposed_m = EXCLUDED.exposed_m, computed_at = EXCLUDED.computed_at;
+    UPDATE feat.t1_tile SET dirty = false WHERE tile_id = :tile;
+""")
+
+
+def config(region: str, geom_md5: str) -> dict:
+    return {"region": region, "geom_md5": geom_md5, "srid": SRID, "buffer_m": BUFFER_M,
+            "tile_m": TILE_M, "max_vertices": MAX_VERTICES}
+
+
+def prepare(eng, region: str = REGION_ISO, full: bool = False) -> int:
+    """
+    Bring parts and tiles in line with raw.osm_roads / raw.osm_water; returns the
+    number of dirty tiles.
+    """
+    with eng.begin() as con:
+        # The tiles are cut from the region outline, so an edited geometry rebuilds them.
+        geom_md5 = con.exec_driver_sql(
+            "SELECT md5(ST_AsEWKB(geom)) FROM meta.region WHERE iso_code = %s", (region,)).scalar()
+        if geom_md5 is None:
+            raise SystemExit(f"Region {region} not found in meta.region.")
+        cfg = json.dumps(config(region, geom_md5), sort_keys=True)
+        con.exec_driver_sql(DDL)
+        old = con.exec_driver_sql("SELECT value FROM feat.t1_config WHERE key = 'config'").scalar()
+        if full or old != cfg:
+            print("[t1] configuration changed or --full: rebuilding parts and tiles")
+            con.exec_driver_sql("TRUNCATE feat.t1_tile_result, feat.t1_tile, "
+                                "feat.t1_road_part, feat.t1_water_part")
+            con.exec_driver_sql(TILES_SQL, {"iso": region, "s": TILE_M})
+            con.exec_driver_sql(
+                "INSERT INTO feat.t1_config VALUES ('config', %s) "
+                "ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value", (cfg,))
+        con.exec_driver_sql(_STAGE_SQL.format(tmp="t1_road_new", parts=ROAD_PARTS))
+        con.exec_driver_sql(ROAD_DIFF_SQL)
+        con.exec_driver_sql(_STAGE_SQL.format(tmp="t1_water_new", parts=WATER_PARTS))
+        con.exec_driver_sql(WATER_DIFF_SQL)
+        # Tiles never computed (e.g. an interrupted run) are dirty as well.
+        con.exec_driver_sql("""
+            UPDATE feat.t1_tile t SET dirty = true
+            WHERE NOT EXISTS (SELECT 1 FROM feat.t1_tile_result r WHERE r.tile_id = t.tile_id)""")
+        n = con.exec_driver_sql("SELECT count(*) FROM feat.t1_tile WHERE dirty").scalar()
+    with eng.connect() as con:
+        con = con.execution_options(isolation_level="AUTOCOMMIT")
+        for t in ("t1_road_part", "t1_water_part", "t1_tile"):
+            con.exec_driver_sql(f"ANALYZE feat.{t}")
+    return int(n)
+
+
+def compute_tile(eng, tile_id: int) -> tuple[float, float]:
+    with eng.begin() as con:
+        road_m, exposed_m = con.execute(TILE_SQL, {"tile": tile_id}).one()
+        con.execute(UPSERT_SQL, {"tile": tile_id, "road_m": road_m, "exposed_m": exposed_m})
+    return road_m, exposed_m
+
+
+def compute_dirty(eng, workers: int = 8):
+    with eng.connect() as con:
+        tiles = [t for (t,) in con.exec_driver_sql(
+            "SELECT tile_id FROM feat.t1_tile WHERE dirty ORDER BY tile_id").fetchall()]
+    # Every worker holds a connection for a whole tile; more workers than pooled
+    # connections would only queue on the pool (and time out behind long tiles).
+    limit = eng.pool.size()
+    if workers > limit:
+        print(f"[warn] --workers {workers} capped at the pool size ({limit}); raise DB_POOL_SIZE for more")
+        workers = limit
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futs = {pool.submit(compute_tile, eng, t): t for t in tiles}
+        for i, fut in enumerate(as_completed(futs), 1):
+            fut.result()
+            if i % 50 == 0 or i == len(tiles):
+                print(f"[t1] tiles {i}/{len(tiles)} ({time.perf_counter() - t0:.1f}s)")
+
+
+def aggregate(eng) -> tuple[float, float, float | None]:
+    """
+    (road_km, exposed_km, share_%) over all tiles; fsum makes it order-independent.
+    """
+    with eng.connect() as con:
+        rows = con.exec_driver_sql("SELECT road_m, exposed_m FROM feat.t1_tile_result").fetchall()
+    road_km = math.fsum(r for r, _ in rows) / 1000.0
+    exposed_km = math.fsum(e for _, e in rows) / 1000.0
+    share = 100.0 * exposed_km / road_km if road_km > 0 else None
+    return road_km, exposed_km, share
+
+
+def write_indicator(eng, share: float, region: str = REGION_ISO):
+    with eng.begin() as c:
+        region_id = c.exec_driver_sql("SELECT region_id FROM meta.region WHERE iso_code=%s;", (region,)).scalar_one()
+        ind_id = c.exec_driver_sql("SELECT indicator_id FROM meta.indicator WHERE indicator_code=%s;",
+                                   (IND_CODE,)).scalar_one()
+        c.exec_driver_sql("""
+          INSERT INTO feat.indicator_value
+          (region_id,indicator_id,time_start,time_end,value_raw,value_norm,source)
+          VALUES (%s,%s,%s,%s,%s,%s,%s)
+          ON CONFLICT (region_id,indicator_id,time_start,time_end)
+          DO UPDATE SET value_raw=EXCLUDED.value_raw, value_norm=EXCLUDED.value_norm, source=EXCLUDED.source;""",
+          (region_id, ind_id, TIME_START, TIME_END, share, share / 100.0,
+           f"OSM roads within {BUFFER_M:g} m of raw.osm_water (EPSG:{SRID}, {TILE_M // 1000} km tiles); "
+           f"value_raw=% road-km"))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Tiled, incremental T1 flood-exposure share.")
+    ap.add_argument("--region", default=REGION_ISO)
+    ap.add_argument("--workers", type=int, default=8, help="Parallel tile connections (at most DB_POOL_SIZE)")
+    ap.add_argument("--full", action="store_true", help="Rebuild parts and tiles from scratch")
+    ap.add_argument("--no-write", action="store_true", help="Do not upsert feat.indicator_value")
+    args = ap.parse_args()
+
+    load_dotenv()
+    eng = get_engine()
+    n = prepare(eng, args.region, full=args.full)
+    print(f"[t1] {n} dirty tile(s)")
+    compute_dirty(eng, workers=args.workers)
+    road_km, exposed_km, share = aggregate(eng)
+    if share is None:
+        raise SystemExit("No road length in the region tiles.")
+    print(f"road_km={road_km:,.3f} exposed_km={exposed_km:,.3f} share={share:.3f}%")
+    if not args.no_write:
+        write_indicator(eng, share, args.region)
+
+
+if __name__ == "__main__":
+    main()
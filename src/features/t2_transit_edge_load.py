@@ -0,0 +1,287 @@
+"""
+Transit-weighted T2: bus shapes matched onto the T2 major-road graph.
+
+Every bus shape (shape_points family, EPSG:2100) is densified to points at most
+STEP_M apart and each point is assigned to the nearest major-road edge by one bulk
+KD-tree query (scipy cKDTree over the edges' densified vertices, built once per
+worker); points farther than MAX_DIST_M from any major road (minor streets,
+depots) stay unmatched. Shapes are matched in chunks of about CHUNK_POINTS points
+on a process pool. A shape covers an edge for the length its matched points
+represent, and the edge load is
+
+    load(edge) = Σ_shapes trips(shape) × min(1, covered(shape, edge) / length(edge))
+
+with trips per shape from the shape_trips family (mean per day over --dates, all
+trips of the feed otherwise), i.e. scheduled bus trips along the edge.
+
+The graph, edge betweenness and p90 follow t2_vuln_central_edges_share_len (major
+classes, endpoints snapped at 1e-5°, k-sampled betweenness weighted by km, p90 and
+length share over distinct graph edges), so the printed share_len is that T2 value.
+The transit-weighted T2 is the share of km × load, over the matched road segments,
+on segments whose graph edge is at or above that p90.
+
+Outputs:
+  docs/t2_transit_edge_load.csv    edge_id, highway, x1, y1, x2, y2, km, centrality, load
+  feat.indicator_value             T2_VULN_CENTRAL_EDGES_SHARE_TRANSIT (unless --no-write)
+
+Usage:
+  python -m src.features.t2_transit_edge_load
+  python -m src.features.t2_transit_edge_load --dates 2024-11-19,2024-11-20,2024-11-21 --workers 8
+"""
+import os
+import time
+import argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import sqlalchemy as sa
+import networkx as nx
+from scipy.spatial import cKDTree
+from dotenv import load_dotenv
+
+from src.config import get_engine
+from src.queries.runner import QueryParams, run, parse_dates
+
+MAJOR = ("motorway", "motorway_link", "trunk", "trunk_link", "primary", "primary_link",
+         "secondary", "secondary_link", "tertiary", "tertiary_link")
+REGION_ISO = "EL30"
+IND_CODE = "T2_VULN_CENTRAL_EDGES_SHARE_TRANSIT"
+TIME_START = "2024-01-01"
+TIME_END = "2024-12-31"
+
+SRID = 2100          # Greek Grid, metres (same as T1)
+STEP_M = 20.0        # max spacing of shape points and edge samples
+MAX_DIST_M = 30.0    # farther from every major road = not on the T2 graph
+CHUNK_POINTS = 500_000
+OUT = "docs/t2_transit_edge_load.csv"
+
+# Same edges as t2_vuln_central_edges_share_len, plus their vertices in EPSG:2100.
+EDGES_SQL = sa.text(f"""
+    WITH ln AS (
+      SELECT highway, (ST_Dump(ST_LineMerge(geom))).geom AS geom
+      FROM raw.osm_roads
+      WHERE highway = ANY(:major) AND NOT ST_IsEmpty(geom)
+    ), e AS (
+      SELECT row_number() OVER () AS edge_id, highway, geom, ST_Transform(geom, {SRID}) AS g
+      FROM ln WHERE ST_NPoints(geom) >= 2
+    )
+    SELECT edge_id, highway,
+           ST_X(ST_StartPoint(geom)) AS x1, ST_Y(ST_StartPoint(geom)) AS y1,
+           ST_X(ST_EndPoint(geom))   AS x2, ST_Y(ST_EndPoint(geom))   AS y2,
+           ST_Length(geom::geography)/1000.0 AS km,
+           ARRAY(SELECT ST_X(d.geom) FROM ST_DumpPoints(g) d ORDER BY d.path) AS xs,
+           ARRAY(SELECT ST_Y(d.geom) FROM ST_DumpPoints(g) d ORDER BY d.path) AS ys
+    FROM e
+""")
+
+
+def node_key(x, y, n=5):
+    return (round(float(x), n), round(float(y), n))
+
+
+def densify(x: np.ndarray, y: np.ndarray, line: np.ndarray, step: float = STEP_M):
+    """
+    Points at most `step` apart along polylines given as consecutive vertices with a
+    line id each (rows of one line contiguous). Returns (px, py, line_id, length_m):
+    every point stands for the `length_m` of line that follows it.
+    """
+    same = line[1:] == line[:-1]
+    x0, y0, ids = x[:-1][same], y[:-1][same], line[:-1][same]
+    dx, dy = np.diff(x)[same], np.diff(y)[same]
+    seg = np.hypot(dx, dy)
+    n = np.maximum(np.ceil(seg / step).astype(np.int64), 1)
+    i = np.repeat(np.arange(len(n)), n)
+    t = (np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)) / n[i]
+    return x0[i] + t * dx[i], y0[i] + t * dy[i], ids[i], (seg / n)[i]
+
+
+_TREE = None
+_EDGE_OF = None
+
+
+def _init_worker(ex: np.ndarray, ey: np.ndarray, eid: np.ndarray):
+    global _TREE, _EDGE_OF
+    _TREE = cKDTree(np.column_stack([ex, ey]))
+    _EDGE_OF = eid
+
+
+def match_chunk(x: np.ndarray, y: np.ndarray, shape: np.ndarray,
+                step: float = STEP_M, max_dist: float = MAX_DIST_M) -> pd.DataFrame:
+    """
+    Covered length per (shape, edge_id) for the shapes in one chunk.
+    """
+    px, py, sid, w = densify(x, y, shape, step)
+    dist, idx = _TREE.query(np.column_stack([px, py]), distance_upper_bound=max_dist)
+    ok = np.isfinite(dist)
+    df = pd.DataFrame({"shape": sid[ok], "edge_id": _EDGE_OF[idx[ok]], "covered_m": w[ok]})
+    return df.groupby(["shape", "edge_id"], as_index=False)["covered_m"].sum()
+
+
+def _chunks(shape: np.ndarray, size: int) -> list[slice]:
+    # Cut only where a new shape starts, so no shape is split across chunks.
+    starts = np.flatnonzero(np.r_[True, shape[1:] != shape[:-1]])
+    pos = np.searchsorted(starts, np.arange(size, len(shape), size))
+    cuts = np.unique(starts[pos[pos < len(starts)]])
+    bounds = [0, *cuts[cuts > 0].tolist(), len(shape)]
+    return [slice(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+
+def load_edges(eng) -> pd.DataFrame:
+    with eng.connect() as con:
+        df = pd.read_sql(EDGES_SQL, con, params={"major": list(MAJOR)})
+    df = df.dropna(subset=["x1", "y1", "x2", "y2", "km"])
+    if df.empty:
+        raise SystemExit("No major segments found.")
+    return df.reset_index(drop=True)
+
+
+def match_shapes(edges: pd.DataFrame, points: pd.DataFrame, workers: int | None = None,
+                 step: float = STEP_M, max_dist: float = MAX_DIST_M) -> pd.DataFrame:
+    """
+    Covered length per (shape_id, edge_id). points: shape_id, x, y in sequence order.
+    """
+    n = edges["xs"].map(len).to_numpy()
+    ex, ey, eid, _ = densify(np.concatenate(edges["xs"].to_list()), np.concatenate(edges["ys"].to_list()),
+                             np.repeat(edges["edge_id"].to_numpy(), n), step)
+    codes, names = pd.factorize(points["shape_id"], sort=False)
+    x, y = points["x"].to_numpy(float), points["y"].to_numpy(float)
+    parts = _chunks(codes, CHUNK_POINTS)
+    print(f"[t2] {len(edges):,} edges ({len(ex):,} samples), {len(names):,} shapes "
+          f"({len(x):,} points) in {len(parts)} chunk(s)")
+
+    workers = min(workers or os.cpu_count() or 4, len(parts))
+    if workers <= 1:
+        _init_worker(ex, ey, eid)
+        frames = [match_chunk(x[s], y[s], codes[s], step, max_dist) for s in parts]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(ex, ey, eid)) as pool:
+            frames = list(pool.map(match_chunk, *zip(*[(x[s], y[s], codes[s]) for s in parts]),
+                                   [step] * len(parts), [max_dist] * len(parts)))
+    cov = pd.concat(frames, ignore_index=True)
+    cov["shape_id"] = np.asarray(names)[cov.pop("shape")]
+    return cov
+
+
+def edge_loads(edges: pd.DataFrame, cov: pd.DataFrame, trips: pd.DataFrame) -> pd.Series:
+    """
+    Scheduled trips along each edge (index edge_id), shapes counted by the share of
+    the edge they cover.
+    """
+    cov = cov.merge(trips, on="shape_id", how="inner")
+    length_m = edges.set_index("edge_id")["km"].mul(1000.0)
+    frac = (cov["covered_m"] / cov["edge_id"].map(length_m).to_numpy()).clip(upper=1.0)
+    load = (cov["trips"] * frac).groupby(cov["edge_id"]).sum()
+    return load.reindex(edges["edge_id"], fill_value=0.0)
+
+
+def centrality(edges: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+    """
+    T2 edge betweenness per row of edges (NaN for edges that collapse to a node),
+    and (centrality, km) per distinct graph edge, as the baseline T2 script sees
+    them (parallel segments with the same snapped endpoints are one graph edge).
+    """
+    u = [node_key(a, b) for a, b in zip(edges["x1"], edges["y1"])]
+    v = [node_key(a, b) for a, b in zip(edges["x2"], edges["y2"])]
+    G = nx.Graph()
+    for a, b, km in zip(u, v, edges["km"]):
+        if a != b:
+            G.add_edge(a, b, weight=float(km), km=float(km))
+    k = min(1500, max(200, int(0.02 * G.number_of_nodes())), G.number_of_nodes())
+    ec = nx.edge_betweenness_centrality(G, k=k, weight="weight", seed=42)
+    print(f"[t2] nodes={G.number_of_nodes():,} edges={G.number_of_edges():,} k={k}")
+    rows = np.array([ec.get((a, b), ec.get((b, a), np.nan)) for a, b in zip(u, v)], float)
+    graph = np.array([(c, G[a][b].get("km", 0.0)) for (a, b), c in ec.items()], float).reshape(-1, 2)
+    return rows, graph
+
+
+def weighted_share(km: np.ndarray, c: np.ndarray, load: np.ndarray,
+                   graph: np.ndarray) -> tuple[float, float | None, float]:
+    """
+    (p90, transit-weighted share %, plain length share %). p90 and the length share
+    are over the distinct graph edges (graph: centrality, km), i.e. the baseline T2
+    value; the transit share applies that threshold to the segment rows, each
+    weighted by km × its own load.
+    """
+    graph = graph[np.isfinite(graph[:, 0])]
+    if graph.size == 0:
+        raise SystemExit("No centrality values—graph may be empty after filtering.")
+    p90 = float(np.quantile(graph[:, 0], 0.90))
+    g_km = graph[:, 1]
+    share_len = 100.0 * float(g_km[graph[:, 0] >= p90].sum()) / float(g_km.sum()) if g_km.sum() > 0 else float("nan")
+
+    ok = np.isfinite(c)
+    w = km[ok] * load[ok]
+    hi = c[ok] >= p90
+    share = 100.0 * float(w[hi].sum()) / float(w.sum()) if w.sum() > 0 else None
+    return p90, share, share_len
+
+
+def write_indicator(eng, share: float, params: QueryParams, region: str = REGION_ISO):
+    with eng.begin() as c:
+        c.exec_driver_sql("""
+          INSERT INTO meta.indicator (system_code, indicator_code, indicator_name, direction, unit, methodology)
+          VALUES ('TRANSPORT', %s, 'Transit-weighted critical edges share', 'UP_IS_BAD', '%%',
+                  'Share of km x scheduled bus trips on edges >= P90 edge betweenness')
+          ON CONFLICT (indicator_code) DO NOTHING;""", (IND_CODE,))
+        region_id = c.exec_driver_sql("SELECT region_id FROM meta.region WHERE iso_code=%s;", (region,)).scalar_one()
+        ind_id = c.exec_driver_sql("SELECT indicator_id FROM meta.indicator WHERE indicator_code=%s;",
+                                   (IND_CODE,)).scalar_one()
+        services = f"{len(params.dates)} dates" if params.dates else "all services"
+        c.exec_driver_sql("""
+          INSERT INTO feat.indicator_value
+          (region_id,indicator_id,time_start,time_end,value_raw,value_norm,source)
+          VALUES (%s,%s,%s,%s,%s,%s,%s)
+          ON CONFLICT (region_id,indicator_id,time_start,time_end)
+          DO UPDATE SET value_raw=EXCLUDED.value_raw, value_norm=EXCLUDED.value_norm, source=EXCLUDED.source;""",
+          (region_id, ind_id, TIME_START, TIME_END, share, share / 100.0,
+           f"Edge betweenness (major roads) weighted by km x bus trips ({services}); GTFS shapes matched "
+           f"to edges within {MAX_DIST_M:g} m (KD-tree, EPSG:{SRID}); value_raw=% of weighted km >=p90"))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Match bus shapes onto the T2 road graph and weight T2 by bus trips.")
+    ap.add_argument("--dates", default="", help="Comma-separated YYYY-MM-DD for trips per day; empty = all trips")
+    ap.add_argument("--feed", default="", help="GTFS table suffix, e.g. _2024 for a pinned feed version")
+    ap.add_argument("--region", default=REGION_ISO)
+    ap.add_argument("--workers", type=int, default=None, help="Matching processes (default: CPU count)")
+    ap.add_argument("--out", default=OUT)
+    ap.add_argument("--no-cache", action="store_true")
+    ap.add_argument("--no-write", action="store_true", help="Do not upsert feat.indicator_value")
+    args = ap.parse_args()
+
+    load_dotenv()
+    eng = get_engine()
+    params = QueryParams(dates=parse_dates(args.dates), feed=args.feed, region=args.region)
+    kw = {"engine": eng, "use_cache": not args.no_cache}
+
+    t0 = time.perf_counter()
+    edges = load_edges(eng)
+    points = run("shape_points", params, **kw)
+    trips = run("shape_trips", params, **kw)
+    if points.empty:
+        raise SystemExit("No bus shapes (raw.gtfs_shapes_bus is empty).")
+    cov = match_shapes(edges, points, workers=args.workers)
+    load = edge_loads(edges, cov, trips)
+    print(f"[t2] matched {cov['shape_id'].nunique():,} shapes to {int((load > 0).sum()):,} edges "
+          f"in {time.perf_counter() - t0:.1f}s")
+
+    c, graph = centrality(edges)
+    p90, share, share_len = weighted_share(edges["km"].to_numpy(float), c, load.to_numpy(float), graph)
+    if share is None:
+        raise SystemExit("No transit load on the T2 graph.")
+    print(f"p90={p90:.6g} share_len={share_len:.3f}% share_transit={share:.3f}%")
+
+    out = edges[["edge_id", "highway", "x1", "y1", "x2", "y2", "km"]].assign(
+        centrality=c, load=load.to_numpy(float))
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    out.to_csv(args.out, index=False, float_format="%.9g")
+    print(f"Saved {args.out}")
+    if not args.no_write:
+        write_indicator(eng, share, params, args.region)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Route-median comparison across any number of variants and windows.
+
+All variant CSVs (mode, route_id, route_short_name, route_long_name, med_minutes)
+are stacked and pivoted once onto a (window, mode, route_id) index. Every
+pairwise delta (later variant − earlier variant) is then one column of a
+matrix, so quantiles and summaries are computed for all pairs of a window in a
+single vectorized call, and top-k lists use np.argpartition instead of a full
+sort. Replaces compare_t3_vs_t3w_multi.py, compare_t3_vs_t3w_multi_full.py and
+compare_evening_t3_vs_t3w_multi.py.
+
+Outputs per (window, base, other), e.g. base=T3, other=T3W_MULTI, window=07_10:
+  docs/t3_vs_t3w_multi_route_deltas_07_10.csv
+  docs/t3_vs_t3w_multi_top_increases_07_10.csv
+  docs/t3_vs_t3w_multi_top_decreases_07_10.csv
+  docs/t3_vs_t3w_multi_deltas_07_10_summary.csv
+plus one long table with every summary: docs/variant_deltas_summary.csv
+
+Usage:
+  python -m src.ifi.compare_variants
+  python -m src.ifi.compare_variants --variant T3=docs/t3_route_medians_{window}.csv \
+      --variant T3W_MULTI=docs/t3w_multi_route_medians_{window}.csv --window 07_10 --window 16_19
+"""
+import argparse
+import warnings
+from itertools import combinations
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_VARIANTS = {
+    "T3": "docs/t3_route_medians_{window}.csv",
+    "T3W_MULTI": "docs/t3w_multi_route_medians_{window}.csv",
+}
+DEFAULT_WINDOWS = ("07_10", "16_19")
+KEY = ["window", "mode", "route_id"]
+NAME_COLS = ["route_short_name", "route_long_name"]
+SUMMARY_COLS = ["n_routes", "delta_min_mean", "delta_min_median", "p25", "p75", "min", "max"]
+
+
+def load_wide(variants: dict[str, str], windows: list[str]) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Return (medians, names): medians is indexed by (window, mode, route_id) with one
+    column per variant (NaN where a route is missing); names holds the first
+    non-empty route names seen for each key.
+    """
+    frames = []
+    for w in windows:
+        for v, pattern in variants.items():
+            df = pd.read_csv(pattern.format(window=w), dtype={"mode": str, "route_id": str})
+            df = df.reindex(columns=["mode", "route_id", *NAME_COLS, "med_minutes"])
+            frames.append(df.assign(window=w, variant=v))
+    long = pd.concat(frames, ignore_index=True)
+
+    medians = (long.drop_duplicates([*KEY, "variant"])
+                   .set_index([*KEY, "variant"])["med_minutes"]
+                   .unstack("variant")
+                   .reindex(columns=list(variants)))
+    names = long.groupby(KEY, sort=False)[NAME_COLS].first().reindex(medians.index)
+    return medians, names
+
+
+def _top_k(vals: np.ndarray, k: int, largest: bool) -> np.ndarray:
+    """
+    Row positions of the k largest (or smallest) non-NaN values, ordered.
+    argpartition selects in O(n); only the k winners are sorted.
+    """
+    fill = -np.inf if largest else np.inf
+    v = np.where(np.isnan(vals), fill, vals)
+    k = min(k, int(np.isfinite(v).sum()))
+    if k == 0:
+        return np.empty(0, dtype=np.intp)
+    key = -v if largest else v
+    idx = np.argpartition(key, k - 1)[:k] if k < len(v) else np.arange(len(v))
+    return idx[np.lexsort((idx, key[idx]))]
+
+
+def compare(medians: pd.DataFrame, names: pd.DataFrame, *, top: int = 30) -> dict[str, pd.DataFrame]:
+    """
+    Compute every output table. Keys are output file stems relative to docs/.
+    """
+    variants = list(medians.columns)
+    pairs = list(combinations(range(len(variants)), 2))
+    if not pairs:
+        raise SystemExit("Need at least two variants to compare.")
+
+    M = medians.to_numpy(dtype=float)
+    base = np.array([i for i, _ in pairs])
+    other = np.array([j for _, j in pairs])
+    D = M[:, other] - M[:, base]                         # (routes, pairs)
+
+    windows = medians.index.get_level_values("window")
+    flat = medians.index.to_frame(index=False).join(names.reset_index(drop=True))
+    out: dict[str, pd.DataFrame] = {}
+    summary_rows = []
+
+    for w in pd.unique(windows):
+        rows = np.flatnonzero(windows == w)
+        Dw = D[rows]
+        valid = ~np.isnan(Dw)
+        n = valid.sum(axis=0)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN pairs → NaN stats
+            q = np.nanquantile(Dw, [0.25, 0.5, 0.75], axis=0)
+            stats = {
+                "n_routes": n,
+                "delta_min_mean": np.nanmean(Dw, axis=0),
+                "delta_min_median": q[1],
+                "p25": q[0],
+                "p75": q[2],
+                "min": np.nanmin(Dw, axis=0),
+                "max": np.nanmax(Dw, axis=0),
+            }
+
+        for p, (i, j) in enumerate(pairs):
+            a, b = variants[i], variants[j]
+            stem = f"{a.lower()}_vs_{b.lower()}"
+            table = flat.iloc[rows].assign(**{f"med_{a}": M[rows, i], f"med_{b}": M[rows, j],
+                                              "delta_min": Dw[:, p]})
+            table = table.drop(columns="window")
+            ok = valid[:, p]
+
+            out[f"{stem}_route_deltas_{w}"] = (table[ok]
+                                               .sort_values(["mode", "delta_min"], ascending=[True, False],
+                                                            kind="stable"))
+            out[f"{stem}_top_increases_{w}"] = table.iloc[_top_k(Dw[:, p], top, largest=True)]
+            out[f"{stem}_top_decreases_{w}"] = table.iloc[_top_k(Dw[:, p], top, largest=False)]
+
+            summ = pd.DataFrame({c: [stats[c][p]] for c in SUMMARY_COLS})
+            out[f"{stem}_deltas_{w}_summary"] = summ
+            summary_rows.append(summ.assign(window=w, base=a, other=b))
+
+    out["variant_deltas_summary"] = (pd.concat(summary_rows, ignore_index=True)
+                                       [["window", "base", "other", *SUMMARY_COLS]])
+    return out
+
+
+def _parse_variant(s: str) -> tuple[str, str]:
+    name, _, pattern = s.partition("=")
+    if not name or not pattern:
+        raise argparse.ArgumentTypeError(f"expected NAME=PATH_PATTERN, got {s!r}")
+    return name, pattern
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare route medians across variants and windows.")
+    ap.add_argument("--variant", action="append", type=_parse_variant,
+                    help="NAME=csv pattern with {window}; order defines delta direction (later − earlier)")
+    ap.add_argument("--window", action="append", help="Window tag substituted into {window}, e.g. 07_10")
+    ap.add_argument("--top", type=int, default=30)
+    ap.add_argument("--outdir", default="docs")
+    args = ap.parse_args()
+
+    variants = dict(args.variant) if args.variant else DEFAULT_VARIANTS
+    windows = args.window or list(DEFAULT_WINDOWS)
+
+    medians, names = load_wide(variants, windows)
+    tables = compare(medians, names, top=args.top)
+
+    outdir = Path(args.outdir)
+    outdir.mkdir(exist_ok=True, parents=True)
+    for stem, df in tables.items():
+        df.to_csv(outdir / f"{stem}.csv", index=False)
+    print(f"Saved {len(tables)} CSVs under {outdir}/ "
+          f"({len(variants)} variants × {len(windows)} windows)")
+
+
+if __name__ == "__main__":
+    main()
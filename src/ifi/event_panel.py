@@ -0,0 +1,228 @@
+"""
+Event × day × region panel of heat and transport series (SEM inputs).
+
+For every raw.event the panel covers a baseline window (--baseline-days before
+t_start) and the event window [t_start, t_end], one row per day and region:
+
+  keys       event_id, event_type, iso_code, region_name, day, rel_day, phase
+  climate    tmax_mean_c, tmax_area_max_c       ERA5 daily max, area mean / area max
+  transport  p50_min_<window>, routes_<window>  scheduled network headway (daily_series)
+  per event  impact_<metric>                    raw.impact
+             <variant>_<window>_min             docs/sem_transport_heatwave.csv
+
+Days of all events are expanded with one np.repeat and every series is joined
+with one merge on (iso_code, day), so adding events costs a few rows, not a loop.
+The upstream series are cached: ERA5 reductions per (region, month) under
+data/cache/panel/ (the .nc downloads stay in data/external/era5/), headways via
+the runner's SQL cache. Summary rows are matched to events through the event
+catalog (docs/events_attica_2024.csv: same region and hazard, overlapping dates).
+
+Usage:
+  python -m src.ifi.event_panel
+  python -m src.ifi.event_panel --baseline-days 28 --window 7-10 --no-climate --out /tmp/panel.csv
+"""
+import argparse
+import datetime as dt
+from pathlib import Path
+from dataclasses import replace
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from src.config import get_engine
+from src.queries.runner import QueryParams, run, parse_list, parse_window
+from src.queries.daily_series import daily_series
+
+OUT = "docs/event_panel.csv"
+CACHE_DIR = Path("data/cache/panel")
+ERA5_DIR = Path("data/external/era5")
+CATALOG = "docs/events_attica_2024.csv"
+SUMMARY = "docs/sem_transport_heatwave.csv"
+ERA5_LAG_DAYS = 6  # ERA5 final data trail real time by about five days
+
+KEY = ["iso_code", "day"]
+
+EVENTS_SQL = """
+    SELECT e.event_id, e.event_type, e.t_start, coalesce(e.t_end, e.t_start) AS t_end,
+           r.iso_code, r.region_name
+    FROM raw.event e
+    JOIN meta.region r ON r.region_id = e.region_id
+    ORDER BY e.event_id
+"""
+
+
+def load_events(eng) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Return (events, impacts): impacts is wide, one impact_<metric> column per metric.
+    """
+    with eng.connect() as con:
+        events = pd.read_sql(EVENTS_SQL, con)
+        impacts = pd.read_sql("SELECT event_id, metric, value FROM raw.impact", con)
+    for c in ("t_start", "t_end"):
+        events[c] = pd.to_datetime(events[c]).dt.normalize()
+    impacts = (impacts.pivot_table(index="event_id", columns="metric", values="value", aggfunc="last")
+                      .add_prefix("impact_"))
+    impacts.columns.name = None
+    return events, impacts
+
+
+def expand_days(events: pd.DataFrame, baseline_days: int) -> pd.DataFrame:
+    """
+    One row per event and day from t_start - baseline_days to t_end.
+    """
+    d0 = (events["t_start"] - pd.Timedelta(days=baseline_days)).to_numpy()
+    n = ((events["t_end"] - events["t_start"]).dt.days + baseline_days + 1).clip(lower=1).to_numpy()
+    rows = np.repeat(np.arange(len(events)), n)
+    offset = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+
+    panel = events.iloc[rows].reset_index(drop=True)
+    panel["day"] = d0[rows] + offset.astype("timedelta64[D]")
+    panel["rel_day"] = (panel["day"] - panel["t_start"]).dt.days
+    panel["phase"] = np.where(panel["rel_day"] < 0, "baseline", "event")
+    return panel
+
+
+def _months(days: pd.Series) -> list[pd.Period]:
+    return sorted(days.dt.to_period("M").unique())
+
+
+def _era5_month(iso: str, month: pd.Period, use_cache: bool) -> pd.DataFrame:
+    cache = CACHE_DIR / f"era5_{iso}_{month.strftime('%Y%m')}.csv"
+    if use_cache and cache.exists():
+        return pd.read_csv(cache, parse_dates=["day"])
+
+    # Imported here so cached and --no-climate runs need neither cdsapi nor xarray.
+    from src.ingest import era5_t2m_heatwave as era5
+
+    # A month still inside the ERA5 lag is incomplete: download it again and do not cache it.
+    complete = month.end_time.date() + dt.timedelta(days=ERA5_LAG_DAYS) < dt.date.today()
+    nc = ERA5_DIR / f"era5_t2m_{iso}_{month.strftime('%Y%m')}.nc"
+    if not nc.exists() or not complete:
+        nc.parent.mkdir(parents=True, exist_ok=True)
+        era5.download_nc(era5.get_area_from_db(iso), str(nc), month.start_time.date(), month.end_time.date())
+    df = era5.daily_series(str(nc))
+
+    if use_cache and complete:
+        cache.parent.mkdir(parents=True, exist_ok=True)
+        df.to_csv(cache, index=False)
+    print(f"[ok] ERA5 {iso} {month}: {len(df)} days")
+    return df
+
+
+def climate_series(panel: pd.DataFrame, use_cache: bool = True, workers: int = 4) -> pd.DataFrame:
+    """
+    Daily ERA5 reductions (iso_code, day, tmax_mean_c, tmax_area_max_c) for every
+    region-month the panel touches; downloads and reductions run on threads.
+    """
+    jobs = [(iso, m) for iso, days in panel.groupby("iso_code")["day"] for m in _months(days)]
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        frames = list(ex.map(lambda j: _era5_month(*j, use_cache).assign(iso_code=j[0]), jobs))
+    if not frames:
+        return pd.DataFrame(columns=[*KEY, "tmax_mean_c", "tmax_area_max_c"])
+    return pd.concat(frames, ignore_index=True).drop_duplicates(KEY)
+
+
+def transport_series(panel: pd.DataFrame, params: QueryParams, windows: list[tuple[int, int]],
+                     **kw) -> pd.DataFrame:
+    """
+    Daily network headway (p50_min_<window>, routes_<window>) per region over the
+    panel's day span clipped to the feed's validity, from daily_series. Days outside
+    the feed have no rows (NaN in the panel).
+    """
+    columns = [f"{v}_{replace(params, window=w).window_tag}" for v in ("p50_min", "routes") for w in windows]
+    empty = pd.DataFrame({"iso_code": pd.Series(dtype=str), "day": pd.Series(dtype="datetime64[ns]"),
+                          **{c: pd.Series(dtype=float) for c in columns}})
+    row = run("feed_validity", params, **kw).iloc[0]
+    if pd.isna(row["start_date"]):
+        print("[warn] feed has no calendar / calendar_dates entries; no headway series")
+        return empty
+    first, last = pd.Timestamp(row["start_date"]), pd.Timestamp(row["end_date"])
+
+    frames = []
+    for iso, days in panel.groupby("iso_code")["day"]:
+        start, end = max(days.min(), first), min(days.max(), last)
+        if start > end:
+            print(f"[skip] {iso}: events {days.min().date()}..{days.max().date()} outside the feed "
+                  f"({first.date()}..{last.date()})")
+            continue
+        network, _ = daily_series(replace(params, region=iso), start.date(), end.date(), windows, **kw)
+        frames.append(network.assign(iso_code=iso))
+    if not frames:
+        return empty
+    net = pd.concat(frames, ignore_index=True)
+    net["day"] = pd.to_datetime(net["day"])
+    wide = net.pivot_table(index=KEY, columns="window", values=["p50_min", "routes"], aggfunc="first")
+    wide.columns = [f"{v}_{w}" for v, w in wide.columns]
+    return wide.reset_index()
+
+
+def summary_by_event(events: pd.DataFrame, catalog_csv: str = CATALOG,
+                     summary_csv: str = SUMMARY) -> pd.DataFrame:
+    """
+    Event-level transport summary (<variant>_<window>_min) keyed by event_id.
+    """
+    catalog = pd.read_csv(catalog_csv, parse_dates=["time_start", "time_end"])
+    summary = pd.read_csv(summary_csv)
+    m = events.merge(catalog, left_on=["region_name", "event_type"], right_on=["region_name", "hazard"])
+    m = m[(m["time_start"] <= m["t_end"]) & (m["time_end"] >= m["t_start"])]
+    codes = m.drop_duplicates("event_id")[["event_id", "event_code"]]
+
+    wide = summary.pivot_table(index="event_code", columns=["variant", "window"], values="minutes",
+                               aggfunc="first")
+    wide.columns = [f"{v}_{w}_min" for v, w in wide.columns]
+    return codes.merge(wide, left_on="event_code", right_index=True).drop(columns="event_code")
+
+
+def build_panel(baseline_days: int = 14, windows: list[tuple[int, int]] | None = None,
+                params: QueryParams | None = None, climate: bool = True, transport: bool = True,
+                use_cache: bool = True, engine=None) -> pd.DataFrame:
+    """
+    Build the event × day × region panel for every raw.event.
+    """
+    eng = engine or get_engine()
+    params = params or QueryParams()
+    windows = windows or [(7, 10), (16, 19)]
+    events, impacts = load_events(eng)
+    if events.empty:
+        raise SystemExit("raw.event is empty.")
+
+    panel = expand_days(events, baseline_days)
+    print(f"[panel] {len(events)} events → {len(panel):,} event-days")
+    if climate:
+        panel = panel.merge(climate_series(panel, use_cache), on=KEY, how="left")
+    if transport:
+        panel = panel.merge(transport_series(panel, params, windows, use_cache=use_cache), on=KEY, how="left")
+    panel = panel.merge(impacts, left_on="event_id", right_index=True, how="left")
+    if Path(CATALOG).exists() and Path(SUMMARY).exists():
+        panel = panel.merge(summary_by_event(events), on="event_id", how="left")
+
+    panel = panel.drop(columns=["t_start", "t_end"]).sort_values(["event_id", "iso_code", "day"])
+    return panel.reset_index(drop=True)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Event × day × region panel of ERA5 heat and transport headways.")
+    ap.add_argument("--baseline-days", type=int, default=14, help="Days before each event start")
+    ap.add_argument("--window", action="append", help="Headway window hours, e.g. 7-10 (default 7-10 and 16-19)")
+    ap.add_argument("--feed", default="", help="GTFS table suffix, e.g. _2024 for a pinned feed version")
+    ap.add_argument("--modes", default="", help="Comma-separated modes (bus,fixed); empty = all")
+    ap.add_argument("--no-climate", action="store_true", help="Skip the ERA5 series")
+    ap.add_argument("--no-transport", action="store_true", help="Skip the headway series")
+    ap.add_argument("--no-cache", action="store_true")
+    ap.add_argument("--out", default=OUT)
+    args = ap.parse_args()
+
+    load_dotenv()
+    params = QueryParams(feed=args.feed, modes=parse_list(args.modes))
+    windows = [parse_window(w) for w in (args.window or ["7-10", "16-19"])]
+    panel = build_panel(args.baseline_days, windows, params, climate=not args.no_climate,
+                        transport=not args.no_transport, use_cache=not args.no_cache)
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    panel.to_csv(args.out, index=False, date_format="%Y-%m-%d")
+    print(f"Saved {args.out} ({len(panel):,} rows, {panel['event_id'].nunique()} events)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Incremental build of the docs/ figure set.
+
+Every src/ifi/plot_*.py module that defines FIGURES (a list of Figure) is
+discovered. A figure is rebuilt only when the hash of its input files, its
+parameters or its plotting module changed, or when an output is missing.
+Stale figures render in parallel worker processes on the Agg backend; the
+hashes of the last successful build are kept in docs/.figures.json.
+
+Usage:
+  python -m src.ifi.figures              # build stale figures
+  python -m src.ifi.figures --force      # rebuild everything
+  python -m src.ifi.figures --list
+"""
+import json
+import hashlib
+import inspect
+import pkgutil
+import argparse
+import importlib
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Callable
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+MANIFEST = Path("docs/.figures.json")
+
+
+@dataclass(frozen=True)
+class Figure:
+    """
+    name:    unique id
+    render:  module-level function render(*inputs, *outputs, **params)
+    inputs:  files read (hashed)
+    outputs: files written
+    params:  keyword arguments passed to render (hashed)
+    """
+    name: str
+    render: Callable
+    inputs: tuple[str, ...]
+    outputs: tuple[str, ...]
+    params: dict = field(default_factory=dict)
+
+    def fingerprint(self) -> str:
+        h = hashlib.sha256()
+        h.update(self.name.encode())
+        h.update(json.dumps(self.params, sort_keys=True, default=str).encode())
+        h.update(Path(inspect.getsourcefile(self.render)).read_bytes())
+        for p in self.inputs:
+            h.update(p.encode())
+            h.update(Path(p).read_bytes())
+        return h.hexdigest()
+
+
+def discover() -> list[Figure]:
+    import src.ifi as pkg
+    figures = []
+    for mod in pkgutil.iter_modules(pkg.__path__):
+        if mod.name.startswith("plot_"):
+            figures.extend(getattr(importlib.import_module(f"src.ifi.{mod.name}"), "FIGURES", []))
+    names = [f.name for f in figures]
+    dupes = {n for n in names if names.count(n) > 1}
+    if dupes:
+        raise SystemExit(f"Duplicate figure names: {sorted(dupes)}")
+    return figures
+
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+def _render(fig: Figure) -> str:
+    for out in fig.outputs:
+        Path(out).parent.mkdir(parents=True, exist_ok=True)
+    fig.render(*fig.inputs, *fig.outputs, **fig.params)
+    import matplotlib.pyplot as plt
+    plt.close("all")
+    return fig.name
+
+
+def load_manifest(path: Path = MANIFEST) -> dict:
+    return json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+
+
+def build(figures: list[Figure], *, force: bool = False, workers: int | None = None,
+          manifest_path: Path = MANIFEST) -> list[str]:
+    manifest = load_manifest(manifest_path)
+    stale = {}
+    for fig in figures:
+        missing_in = [p for p in fig.inputs if not Path(p).exists()]
+        if missing_in:
+            print(f"[skip] {fig.name}: missing input(s) {missing_in}")
+            continue
+        fp = fig.fingerprint()
+        up_to_date = (manifest.get(fig.name) == fp
+                      and all(Path(o).exists() for o in fig.outputs))
+        if force or not up_to_date:
+            stale[fig.name] = (fig, fp)
+
+    print(f"[figures] {len(figures)} defined, {len(stale)} stale")
+    built = []
+    if stale:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            futs = {pool.submit(_render, fig): name for name, (fig, _) in stale.items()}
+            for fut in as_completed(futs):
+                name = futs[fut]
+                try:
+                    fut.result()
+                except Exception as e:
+                    print(f"[fail] {name}: {e}")
+                    continue
+                manifest[name] = stale[name][1]
+                built.append(name)
+                print(f"[ok] {name} → {', '.join(stale[name][0].outputs)}")
+
+        manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        manifest_path.write_text(json.dumps(manifest, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+    return built
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Build stale figures under docs/ in parallel.")
+    ap.add_argument("names", nargs="*", help="Only these figures (default: all)")
+    ap.add_argument("--force", action="store_true", help="Ignore the manifest and rebuild")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--list", action="store_true", help="List figure definitions and exit")
+    args = ap.parse_args()
+
+    figures = discover()
+    if args.names:
+        unknown = set(args.names) - {f.name for f in figures}
+        if unknown:
+            raise SystemExit(f"Unknown figure(s): {sorted(unknown)}")
+        figures = [f for f in figures if f.name in args.names]
+    if args.list:
+        for f in figures:
+            print(f"{f.name:32s} {', '.join(f.inputs)} → {', '.join(f.outputs)}")
+        return
+    build(figures, force=args.force, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
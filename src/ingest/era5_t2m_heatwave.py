@@ -12,28 +12,30 @@ EVENT_DATE = "2024-07-08"
 START = dt.date(2024,7,8)
 END   = dt.date(2024,7,23)
 
-def get_area_from_db():
+def get_area_from_db(iso=REGION_ISO):
     eng = make_engine()
     with eng.connect() as con:
         row = con.exec_driver_sql("""
             SELECT ST_YMax(ext), ST_XMin(ext), ST_YMin(ext), ST_XMax(ext)
             FROM (SELECT ST_Extent(geom) AS ext FROM meta.region WHERE iso_code=%s) s;
-        """, (REGION_ISO,)).first()
+        """, (iso,)).first()
     north, west, south, east = map(float, row)
     pad = 0.1
     return [north+pad, west-pad, south-pad, east+pad]
 
-def download_nc(area, out_nc):
+def download_nc(area, out_nc, start=START, end=END):
+    # CDS takes the product of year x month x day; keep [start, end] within one month.
     c = cdsapi.Client()
-    days = [d.strftime("%d") for d in pd.date_range(START, END, freq="D")]
+    rng = pd.date_range(start, end, freq="D")
+    days = sorted({d.strftime("%d") for d in rng})
     times = [f"{h:02d}:00" for h in range(24)]
     c.retrieve(
         "reanalysis-era5-single-levels",
         {
             "product_type": "reanalysis",
             "variable": ["2m_temperature"],
-            "year": "2024",
-            "month": "07",
+            "year": sorted({d.strftime("%Y") for d in rng}),
+            "month": sorted({d.strftime("%m") for d in rng}),
             "day": days,
             "time": times,
             "area": area,
@@ -57,7 +59,7 @@ def _find_time_dim(da: xr.DataArray) -> str:
         return non_spatial[0]
     raise RuntimeError(f"No time-like coordinate found; dims={da.dims}, coords={list(da.coords)}")
 
-def process_and_insert(out_nc):
+def _daily_reductions(out_nc):
     ds = xr.open_dataset(out_nc, engine="h5netcdf")
     if "t2m" not in ds:
         raise RuntimeError(f"'t2m' variable not found in dataset variables: {list(ds.data_vars)}")
@@ -72,6 +74,19 @@ def process_and_insert(out_nc):
     # Two aggregations across space
     area_mean = daily_max.mean(dim=spatial_dims)  # spatial mean of daily max
     area_max  = daily_max.max(dim=spatial_dims)   # spatial max of daily max
+    return area_mean, area_max, t2m_c.dims, tdim, spatial_dims
+
+def daily_series(out_nc) -> pd.DataFrame:
+    """One row per day: day, tmax_mean_c (area mean of daily max), tmax_area_max_c (area max)."""
+    area_mean, area_max, _, tdim, _ = _daily_reductions(out_nc)
+    return pd.DataFrame({
+        "day": pd.to_datetime(area_mean[tdim].values).normalize(),
+        "tmax_mean_c": area_mean.values.astype(float),
+        "tmax_area_max_c": area_max.values.astype(float),
+    })
+
+def process_and_insert(out_nc):
+    area_mean, area_max, dims, tdim, spatial_dims = _daily_reductions(out_nc)
 
     metrics = {
         # Area-mean diagnostics (good for broad stress)
@@ -112,7 +127,7 @@ def process_and_insert(out_nc):
                 (event_id, metric, float(value))
             )
 
-    print("Detected dims:", t2m_c.dims, "| time dim:", tdim, "| spatial dims:", spatial_dims)
+    print("Detected dims:", dims, "| time dim:", tdim, "| spatial dims:", spatial_dims)
     print("Inserted metrics:", metrics)
 
 def main():
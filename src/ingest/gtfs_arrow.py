@@ -0,0 +1,191 @@
+"""
+Arrow CSV parse backend for GTFS zip members.
+
+Members are decoded straight from the zip stream by pyarrow's multithreaded CSV
+reader with explicit column types (gtfs_load.DTYPES), so parsing uses every core
+instead of one pandas C-engine thread. Header cells go through the same
+normalization as the pandas path (BOM, quotes, case, known misspellings); columns
+missing from a feed come back as typed nulls. Rows with the wrong number of
+fields are collected by an invalid-row handler and skipped, so one bad line no
+longer sends the whole file through the python engine (gtfs_load fallback 2).
+
+Light members are read whole (read_csv). stop_times is read in PIECE_SIZE pieces
+cut at line ends, and each piece goes through the same threaded read_csv, so a
+worker holds at most one piece of it. (pyarrow's streaming reader, open_csv,
+parses on a single thread.) Like the parallel reader itself, this assumes no
+quoted newlines inside fields. Batches come out
+as Arrow record batches or as pandas frames with the DTYPES dtypes (string /
+Int64 / float64), ready for gtfs_load._to_staging.
+
+Usage:
+  python -m src.ingest.gtfs_arrow --zip data/gtfs_bus.zip --member stop_times.txt
+"""
+import csv
+import time
+import zipfile
+import argparse
+from dataclasses import dataclass, field
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+from src.ingest.gtfs_load import DTYPES, FILES, normalize_column
+
+BLOCK_SIZE = 16 << 20  # bytes per parse block; blocks are parsed in parallel
+CHUNK_ROWS = 200_000   # rows per yielded batch (same as the pandas chunker)
+PIECE_SIZE = 256 << 20  # bytes of stop_times parsed per read_csv call
+
+_ARROW_TYPES = {"string": pa.string(), "Int64": pa.int64(), "float64": pa.float64()}
+_PANDAS_TYPES = {pa.string(): pd.StringDtype(), pa.int64(): pd.Int64Dtype()}.get
+
+
+@dataclass
+class BadRows:
+    """
+    Invalid-row handler: records every row whose field count does not match the
+    header and tells Arrow to skip it. Keeps the first `keep` rows verbatim.
+    """
+    keep: int = 20
+    count: int = 0
+    samples: list[dict] = field(default_factory=list)
+
+    def __call__(self, row) -> str:
+        self.count += 1
+        if len(self.samples) < self.keep:
+            self.samples.append({"line": row.number, "expected": row.expected_columns,
+                                 "actual": row.actual_columns, "text": row.text})
+        return "skip"
+
+    def report(self, member: str):
+        if self.count:
+            # Line numbers are only known when parsing single-threaded.
+            first = self.samples[0]
+            where = f" line {first['line']}" if first["line"] is not None else ""
+            print(f"[warn] {member}: skipped {self.count:,} malformed row(s), e.g.{where} "
+                  f"{first['text'][:120]!r}")
+
+
+def _header(zf: zipfile.ZipFile, member: str) -> list[str]:
+    with zf.open(member) as f:
+        line = f.readline().decode("utf-8-sig", errors="replace").rstrip("\r\n")
+    names = []
+    for i, c in enumerate(next(csv.reader([line]))):
+        n = normalize_column(c)
+        # Duplicate header cells would make Arrow reject the file; keep the first.
+        names.append(n if n not in names else f"{n}__dup{i}")
+    return names
+
+
+def _options(zf: zipfile.ZipFile, member: str, kind: str, bad: BadRows, block_size: int):
+    names = _header(zf, member)
+    wanted = DTYPES[kind]
+    read = pacsv.ReadOptions(column_names=names, skip_rows=1, use_threads=True, block_size=block_size)
+    parse = pacsv.ParseOptions(invalid_row_handler=bad)
+    convert = pacsv.ConvertOptions(
+        column_types={c: _ARROW_TYPES[t] for c, t in wanted.items()},
+        include_columns=list(wanted), include_missing_columns=True,
+        strings_can_be_null=True,  # empty fields → null, as in the pandas path
+    )
+    return read, parse, convert
+
+
+def read_table(zf: zipfile.ZipFile, member: str, kind: str, *, bad: BadRows | None = None,
+               block_size: int = BLOCK_SIZE) -> pa.Table | None:
+    """
+    Parse a whole member into an Arrow table with the DTYPES columns, in DTYPES order.
+    Returns None if the member is not in the zip.
+    """
+    if member not in zf.namelist():
+        return None
+    bad = bad if bad is not None else BadRows()
+    read, parse, convert = _options(zf, member, kind, bad, block_size)
+    with zf.open(member) as f:
+        table = pacsv.read_csv(f, read_options=read, parse_options=parse, convert_options=convert)
+    bad.report(member)
+    return table.select(list(DTYPES[kind]))
+
+
+def _pieces(f, size: int):
+    """
+    Raw bytes of f in pieces of about `size`, each ending at a line end.
+    """
+    rest = b""
+    while buf := f.read(size):
+        buf = rest + buf
+        cut = buf.rfind(b"\n") + 1
+        rest = buf[cut:]
+        if cut:
+            yield buf[:cut]
+    if rest:
+        yield rest
+
+
+def iter_batches(zf: zipfile.ZipFile, member: str, kind: str, *, chunksize: int = CHUNK_ROWS,
+                 bad: BadRows | None = None, block_size: int = BLOCK_SIZE,
+                 piece_size: int = PIECE_SIZE):
+    """
+    Stream record batches of at most chunksize rows. The member is parsed one
+    piece_size piece at a time (multithreaded within the piece), never whole.
+    """
+    if member not in zf.namelist():
+        return
+    bad = bad if bad is not None else BadRows()
+    read, parse, convert = _options(zf, member, kind, bad, block_size)
+    read.skip_rows = 0  # the header line is consumed below, pieces have none
+    names = list(DTYPES[kind])
+    with zf.open(member) as f:
+        f.readline()
+        for piece in _pieces(f, piece_size):
+            table = pacsv.read_csv(pa.py_buffer(piece), read_options=read, parse_options=parse,
+                                   convert_options=convert).select(names)
+            for batch in table.to_batches(max_chunksize=chunksize):
+                yield batch
+    bad.report(member)
+
+
+def to_pandas(batch) -> pd.DataFrame:
+    """
+    Record batch or table → DataFrame with the pandas-path dtypes.
+    """
+    return batch.to_pandas(types_mapper=_PANDAS_TYPES)
+
+
+def iter_frames(zf: zipfile.ZipFile, member: str, kind: str, *, chunksize: int = CHUNK_ROWS,
+                bad: BadRows | None = None):
+    """
+    Same as iter_batches, as pandas frames (drop-in for gtfs_load.iter_stop_times_chunks).
+    """
+    for batch in iter_batches(zf, member, kind, chunksize=chunksize, bad=bad):
+        yield to_pandas(batch)
+
+
+def read_frame(zf: zipfile.ZipFile, member: str, kind: str, *, bad: BadRows | None = None):
+    """
+    Whole member as one DataFrame (drop-in for gtfs_load.read_member).
+    """
+    table = read_table(zf, member, kind, bad=bad)
+    return None if table is None else to_pandas(table)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Parse GTFS zip members with the Arrow CSV reader (timing / check).")
+    ap.add_argument("--zip", dest="zip_path", required=True)
+    ap.add_argument("--member", action="append", default=None, help="e.g. stop_times.txt (default: all)")
+    args = ap.parse_args()
+
+    kinds = {member: kind for kind, member in FILES}
+    with zipfile.ZipFile(args.zip_path) as zf:
+        for member in args.member or list(kinds):
+            t0 = time.perf_counter()
+            bad = BadRows()
+            table = read_table(zf, member, kinds[member], bad=bad)
+            if table is None:
+                print(f"[skip] {member} not in ZIP")
+                continue
+            print(f"[ok] {member}: {table.num_rows:,} rows, {bad.count:,} bad, "
+                  f"{table.nbytes / 1e6:.1f} MB in {time.perf_counter() - t0:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Concurrent ingest of several GTFS feeds in one command.
+
+Every member of every feed is parsed and written to its load's staging table in
+a worker process (members of one feed are independent until keys are built), so
+the bus and fixed-line feeds load side by side. Workers read their member from
+the zip themselves and hold at most one stop_times chunk, so memory is bounded by
+--workers, not by the feeds. As soon as all members of a feed are in, its
+geometry, keys and indexes are built on threads while other members still load.
+All feeds are then attached and made current in one transaction, the union views
+are rebuilt and the partitioned parents are ANALYZEd. This replaces separate
+gtfs_load runs followed by create_gtfs_union_views.sql / create_gtfs_indexes.sql.
+
+Usage:
+  python -m src.ingest.gtfs_ingest --feed bus:2025=data/gtfs_bus.zip --feed fixed:2025=data/gtfs_fixed.zip
+  python -m src.ingest.gtfs_ingest --feed bus:2025=data/gtfs_bus.zip --workers 8 --prune
+"""
+import os
+import re
+import time
+import argparse
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+
+from src.config import get_engine
+from src.ingest import gtfs_store
+from src.ingest.gtfs_load import FILES, PARSERS, load_member, finish_load, staging_tables
+
+_SPEC = re.compile(r"^(\w+):(\w+)=(.+)$")
+
+# Largest members first, so the slowest one starts at once and sets the wall time.
+_ORDER = ("stop_times", "shapes", "trips", "stops", "calendar_dates", "routes", "calendar")
+
+
+def _init_worker():
+    # Forked workers must not reuse the parent's pooled connections.
+    get_engine().dispose(close=False)
+
+
+@dataclass(frozen=True)
+class FeedSpec:
+    mode: str
+    version: str
+    zip_path: str
+
+    @classmethod
+    def parse(cls, s: str) -> "FeedSpec":
+        m = _SPEC.match(s.strip())
+        if not m:
+            raise ValueError(f"feed must look like MODE:VERSION=path.zip, got {s!r}")
+        return cls(*m.groups())
+
+
+def ingest(feeds: list[FeedSpec], workers: int | None = None, prune: bool = False,
+           parser: str = "arrow") -> dict[FeedSpec, int]:
+    """
+    Load several feeds concurrently; returns the load id per feed. On any failure
+    nothing is attached and the current feeds stay as they were.
+    """
+    if len({f.mode for f in feeds}) < len(feeds):
+        raise ValueError("at most one feed per mode")
+    for f in feeds:
+        if not os.path.exists(f.zip_path):
+            raise FileNotFoundError(f"ZIP not found: {f.zip_path}")
+    workers = workers or os.cpu_count() or 4
+    eng = get_engine()
+    with eng.connect() as con:
+        if con.exec_driver_sql("SELECT to_regclass('raw.gtfs_feed')").scalar() is None:
+            gtfs_store.ensure_schema(eng)
+
+    t0 = time.perf_counter()
+    loads = {f: gtfs_store.begin_load(eng, f.mode, f.version, source=os.path.abspath(f.zip_path))
+             for f in feeds}
+    # Index/ANALYZE threads share the pooled engine; stay within its pool.
+    db_workers = max(1, min(workers, eng.pool.size() // len(feeds)))
+    try:
+        members = dict(FILES)
+        tables = {f: staging_tables(eng, load_id) for f, load_id in loads.items()}
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as procs, \
+                ThreadPoolExecutor(max_workers=len(feeds)) as threads:
+            futs = {}
+            for kind in _ORDER:
+                for f in feeds:
+                    futs[procs.submit(load_member, f.zip_path, kind, members[kind], tables[f][kind],
+                                      parser=parser)] = f
+            left = {f: len(_ORDER) for f in feeds}
+            finishing = []
+            for fut in as_completed(futs):
+                if fut.exception() is not None:
+                    for other in futs:
+                        other.cancel()
+                    fut.result()
+                f = futs[fut]
+                left[f] -= 1
+                if left[f] == 0:
+                    print(f"[ok] {f.mode} {f.version}: members loaded ({time.perf_counter() - t0:.1f}s)")
+                    finishing.append(threads.submit(finish_load, eng, loads[f], db_workers))
+            for fut in finishing:
+                fut.result()
+
+        gtfs_store.attach_loads(eng, list(loads.values()))
+    except BaseException:
+        print("[fail] ingest: dropping staging tables; current feeds unchanged")
+        for load_id in loads.values():
+            gtfs_store.drop_load(eng, load_id)
+        raise
+
+    gtfs_store.create_union_views(eng)
+    gtfs_store.analyze(eng, db_workers * len(feeds))
+    if prune:
+        for load_id in loads.values():
+            for old in gtfs_store.superseded_loads(eng, load_id):
+                gtfs_store.drop_load(eng, old)
+    print(f"GTFS ingest complete: {len(feeds)} feed(s) in {time.perf_counter() - t0:.1f}s")
+    return loads
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Load several GTFS feeds concurrently and swap them in atomically.")
+    ap.add_argument("--feed", action="append", required=True, type=FeedSpec.parse,
+                    help="MODE:VERSION=path.zip (repeatable, one per mode)")
+    ap.add_argument("--workers", type=int, default=None, help="Parallel member loads (default: CPU count)")
+    ap.add_argument("--prune", action="store_true", help="Drop earlier loads of the same mode and version")
+    ap.add_argument("--parser", choices=PARSERS, default="arrow", help="CSV parse backend")
+    args = ap.parse_args()
+
+    load_dotenv()
+    ingest(args.feed, workers=args.workers, prune=args.prune, parser=args.parser)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,8 @@ import zipfile
 import argparse
 import pandas as pd
 from dotenv import load_dotenv
-from src.config import make_engine
+from src.config import make_engine, get_engine
+from src.ingest import gtfs_store
 
 # Minimal dtypes to keep memory and types sane
 DTYPES = {
@@ -38,6 +39,8 @@ DTYPES = {
     },
 }
 
+PARSERS = ("arrow", "pandas")
+
 FILES = [
     ("routes",         "routes.txt"),
     ("trips",          "trips.txt"),
@@ -60,45 +63,42 @@ def read_member(zf: zipfile.ZipFile, member: str, dtypes: dict | None):
         return pd.read_csv(f, dtype=dtypes)
 
 
+_SYNONYMS = {
+    "tripid": "trip_id",
+    "stopid": "stop_id",
+    "stopsequence": "stop_sequence",
+    "pickuptype": "pickup_type",
+    "dropoff_type": "drop_off_type",
+    "drop_offtype": "drop_off_type",
+    "drop-off_type": "drop_off_type",
+    # very rare typos seen in the wild
+    "arrivaltime": "arrival_time",
+    "departuretime": "departure_time",
+}
+
+
+def normalize_column(name: str) -> str:
+    """
+    GTFS name for a header cell: strips BOM/quotes/whitespace, normalizes separators
+    and case, and maps known misspellings.
+    """
+    s = str(name)
+    # Remove BOM, surrounding quotes and whitespace
+    s = s.lstrip("\ufeff").strip().strip('"').strip("'")
+    # Normalize separators and case
+    s = s.replace(" ", "_").replace("-", "_").lower()
+    return _SYNONYMS.get(s, s)
+
+
 def _normalize_stop_times_df(df: pd.DataFrame) -> pd.DataFrame:
     """
     Normalize header to GTFS names; add missing cols as NA; keep canonical order.
     Also strips quotes/BOM/whitespace from header names.
     """
-    expected = [
-        "trip_id", "arrival_time", "departure_time",
-        "stop_id", "stop_sequence", "pickup_type", "drop_off_type"
-    ]
-
-    def norm(s: str) -> str:
-        s = str(s)
-        # Remove BOM, surrounding quotes and whitespace
-        s = s.lstrip("\ufeff").strip().strip('"').strip("'")
-        # Normalize separators and case
-        s = s.replace(" ", "_").replace("-", "_").lower()
-        return s
-
-    synonyms = {
-        "tripid": "trip_id",
-        "stopid": "stop_id",
-        "stopsequence": "stop_sequence",
-        "pickuptype": "pickup_type",
-        "dropoff_type": "drop_off_type",
-        "drop_offtype": "drop_off_type",
-        "drop-off_type": "drop_off_type",
-        # very rare typos seen in the wild
-        "arrivaltime": "arrival_time",
-        "departuretime": "departure_time",
-    }
-
-    cols = []
-    for c in df.columns:
-        n = norm(c)
-        n = synonyms.get(n, n)
-        cols.append(n)
+    expected = list(DTYPES["stop_times"])
 
     df = df.copy()
-    df.columns = cols
+    df.columns = [normalize_column(c) for c in df.columns]
 
     for col in expected:
         if col not in df.columns:
@@ -199,75 +199,211 @@ def iter_stop_times_chunks(zf: zipfile.ZipFile, member: str):
     #         yield _normalize_stop_times_df(chunk)
 
 
-def load_zip(zip_path: str, suffix: str = ""):
-    suffix = (suffix or "").strip()
-    if suffix and not suffix.startswith("_"):
-        suffix = "_" + suffix
+# Dense int4 surrogate keys per feed load. Dictionaries (raw.gtfs_<kind>_dict_<mode>)
+# keep the original ids; the keyed fact tables (raw.gtfs_*_k_<mode>) hold only integers
+# and arrival seconds, parsed with the same HH:MM:SS rule as the headway SQL. Keys
+# follow the sort order of the ids, so ties broken on keys break the same way as on
+# ids. Filled into the load's staging tables (see gtfs_store) before they are attached.
+KEYS_SQL = """
+INSERT INTO {route_dict} (route_key, route_id)
+SELECT row_number() OVER (ORDER BY route_id)::int4, route_id
+FROM (SELECT route_id::text FROM {routes} UNION SELECT route_id::text FROM {trips}) u
+WHERE route_id IS NOT NULL;
+
+INSERT INTO {trip_dict} (trip_key, trip_id)
+SELECT row_number() OVER (ORDER BY trip_id)::int4, trip_id
+FROM (SELECT DISTINCT trip_id::text FROM {trips} WHERE trip_id IS NOT NULL) u;
+
+INSERT INTO {stop_dict} (stop_key, stop_id)
+SELECT row_number() OVER (ORDER BY stop_id)::int4, stop_id
+FROM (SELECT stop_id::text FROM {stops} UNION SELECT stop_id::text FROM {stop_times}) u
+WHERE stop_id IS NOT NULL;
+
+INSERT INTO {service_dict} (service_key, service_id)
+SELECT row_number() OVER (ORDER BY service_id)::int4, service_id
+FROM (SELECT DISTINCT service_id::text FROM {trips} WHERE service_id IS NOT NULL) u;
+
+INSERT INTO {trips_k} (trip_key, route_key, service_key, direction_id)
+SELECT DISTINCT ON (td.trip_key) td.trip_key, rd.route_key, sd.service_key, t.direction_id::smallint
+FROM {trips} t
+JOIN {trip_dict} td ON td.trip_id = t.trip_id::text
+JOIN {service_dict} sd ON sd.service_id = t.service_id::text
+LEFT JOIN {route_dict} rd ON rd.route_id = t.route_id::text
+ORDER BY td.trip_key;
+
+INSERT INTO {stop_times_k} (trip_key, stop_sequence, stop_key, arrival_sec)
+SELECT td.trip_key, st.stop_sequence::int4, sd.stop_key,
+       CASE WHEN st.arrival_time ~ '^[0-9]+:[0-9]{{2}}:[0-9]{{2}}$'
+            THEN split_part(st.arrival_time,':',1)::int*3600
+               + split_part(st.arrival_time,':',2)::int*60
+               + split_part(st.arrival_time,':',3)::int
+       END
+FROM {stop_times} st
+JOIN {trip_dict} td ON td.trip_id = st.trip_id::text
+JOIN {stop_dict} sd ON sd.stop_id = st.stop_id::text
+ORDER BY td.trip_key, st.stop_sequence;
+
+INSERT INTO {stops_k} (stop_key, stop_lon, stop_lat, geom)
+SELECT DISTINCT ON (sd.stop_key) sd.stop_key, g.stop_lon, g.stop_lat, g.geom
+FROM {stops_geom} g
+JOIN {stop_dict} sd ON sd.stop_id = g.stop_id::text
+ORDER BY sd.stop_key;
+"""
+
+STOPS_GEOM_SQL = """
+INSERT INTO {stops_geom} ({cols}, geom)
+SELECT {cols}, ST_SetSRID(ST_MakePoint(stop_lon, stop_lat), 4326)
+FROM {stops}
+WHERE stop_lon IS NOT NULL AND stop_lat IS NOT NULL;
+"""
+
+
+def staging_tables(eng, load_id: int) -> dict[str, str]:
+    with eng.connect() as con:
+        mode_name, _, _ = gtfs_store.load_info(con, load_id)
+    return {kind: gtfs_store.staging(kind, mode_name, load_id) for kind in gtfs_store.KINDS}
+
+
+def build_geometry(eng, load_id: int):
+    t = staging_tables(eng, load_id)
+    cols = ", ".join(c for c, _ in gtfs_store.COLUMNS["stops"])
+    with eng.begin() as con:
+        con.exec_driver_sql(STOPS_GEOM_SQL.format(stops_geom=t["stops_geom"], stops=t["stops"], cols=cols))
+
 
-    eng = make_engine()
+def build_keys(eng, load_id: int):
+    """
+    Fill the dictionary tables and integer-keyed copies of trips, stop_times and
+    stops for one (not yet attached) load.
+    """
+    t = staging_tables(eng, load_id)
+    with eng.begin() as con:
+        con.exec_driver_sql(KEYS_SQL.format(**t))
+    n = pd.read_sql(f"SELECT COUNT(*) AS n FROM {t['stop_times_k']}", eng)["n"].iat[0]
+    print(f"[ok] keyed tables of load {load_id}: {n:,} stop_times")
+
+
+def _to_staging(df: pd.DataFrame, kind: str, table: str, eng, chunksize: int | None = None):
+    """
+    Append a parsed member to its staging table, restricted to the stored columns.
+    """
+    df = df.reindex(columns=[c for c, _ in gtfs_store.COLUMNS[kind]])
+    schema, name = table.split(".", 1)
+    df.to_sql(name, eng, schema=schema, if_exists="append", index=False, method="multi", chunksize=chunksize)
 
+
+def _parse_member(zf: zipfile.ZipFile, kind: str, member: str, parser: str):
+    """
+    Frames of one member: the whole member for light tables, a lazy stream of
+    200k-row chunks for stop_times. parser="arrow" uses gtfs_arrow and falls back
+    to pandas if Arrow rejects the file (e.g. a value that does not convert to its
+    column type); for the stop_times stream that happens in load_member.
+    """
+    if parser == "arrow":
+        try:
+            import pyarrow as pa
+            from src.ingest import gtfs_arrow
+        except ImportError:
+            print("[warn] pyarrow not installed; using the pandas parser")
+        else:
+            if kind == "stop_times":
+                return gtfs_arrow.iter_batches(zf, member, kind), gtfs_arrow.to_pandas
+            try:
+                return [gtfs_arrow.read_table(zf, member, kind)], gtfs_arrow.to_pandas
+            except pa.ArrowInvalid as e:
+                print(f"[warn] {member}: Arrow parse failed ({e}); using the pandas parser")
+    if kind == "stop_times":
+        return iter_stop_times_chunks(zf, member), None
+    return [read_member(zf, member, DTYPES.get(kind))], None
+
+
+def load_member(zip_path: str, kind: str, member: str, table: str, engine=None,
+                parser: str = "arrow") -> int | None:
+    """
+    Parse one zip member and append it to a staging table (stop_times chunk by chunk).
+    Returns the row count, or None if the member is not in the zip. Safe to run in a
+    worker process: it opens the zip and a connection of its own.
+    """
+    eng = engine or get_engine()
     with zipfile.ZipFile(zip_path, "r") as zf:
-        # Light tables (everything except stop_times)
+        if member not in zf.namelist():
+            print(f"[skip] {member} not in {os.path.basename(zip_path)}")
+            return None
+        chunks, convert = _parse_member(zf, kind, member, parser)
+        if convert is None or kind != "stop_times":
+            return _append(chunks, convert, kind, table, eng)
+        import pyarrow as pa
+        try:
+            return _append(chunks, convert, kind, table, eng)
+        except pa.ArrowInvalid as e:  # raised mid-stream, after some chunks are in
+            print(f"[warn] {member}: Arrow parse failed ({e}); reloading with the pandas parser")
+            with eng.begin() as con:
+                con.exec_driver_sql(f"TRUNCATE {table}")
+            return _append(iter_stop_times_chunks(zf, member), None, kind, table, eng)
+
+
+def _append(chunks, convert, kind: str, table: str, eng) -> int:
+    total = 0
+    for chunk in chunks:
+        df = convert(chunk) if convert else chunk
+        _to_staging(df, kind, table, eng, chunksize=50_000 if kind != "stop_times" else None)
+        total += len(df)
+        print(f"[ok] {table} += {len(df):,} (total {total:,})")
+    return total
+
+
+def finish_load(eng, load_id: int, workers: int = 1):
+    """
+    Derived tables and indexes of a load whose members are all in staging.
+    """
+    build_geometry(eng, load_id)
+    build_keys(eng, load_id)
+    gtfs_store.index_staging(eng, load_id, workers=workers)
+
+
+def load_zip(zip_path: str, mode: str, version: str, prune: bool = False, parser: str = "arrow") -> int:
+    """
+    Load one feed version of one mode into a new, detached partition set, then attach
+    it and make it current atomically. Returns the load id.
+    See gtfs_ingest for several feeds / parallel members.
+    """
+    eng = make_engine()
+    with eng.connect() as con:
+        if con.exec_driver_sql("SELECT to_regclass('raw.gtfs_feed')").scalar() is None:
+            gtfs_store.ensure_schema(eng)
+
+    load_id = gtfs_store.begin_load(eng, mode, version, source=os.path.abspath(zip_path))
+    t = staging_tables(eng, load_id)
+    try:
         for name, member in FILES:
-            if name == "stop_times":
-                continue
-            df = read_member(zf, member, DTYPES.get(name))
-            if df is None:
-                print(f"[skip] {member} not in ZIP")
-                continue
-            table = f"gtfs_{name}{suffix}"
-            df.to_sql(table, eng, schema="raw", if_exists="replace", index=False, method="multi", chunksize=50_000)
-            print(f"[ok] raw.{table}: {len(df):,} rows")
-
-        # stop_times (robust, chunked)
-        member = "stop_times.txt"
-        if member in zf.namelist():
-            first = True
-            total = 0
-            for chunk in iter_stop_times_chunks(zf, member):
-                table = f"gtfs_stop_times{suffix}"
-                chunk.to_sql(
-                    table, eng, schema="raw",
-                    if_exists=("replace" if first else "append"),
-                    index=False, method="multi"
-                )
-                total += len(chunk)
-                print(f"[ok] raw.{table} += {len(chunk):,} (total {total:,})")
-                first = False
-        else:
-            print(f"[skip] {member} not in ZIP")
+            load_member(zip_path, name, member, t[name], engine=eng, parser=parser)
+        finish_load(eng, load_id)
+        gtfs_store.attach_load(eng, load_id)
+    except BaseException:
+        print(f"[fail] load {load_id}: dropping its staging tables; current feed unchanged")
+        gtfs_store.drop_load(eng, load_id)
+        raise
 
-    # Geometry + indexes
-    with eng.begin() as con:
-        con.exec_driver_sql(f"""
-            DROP TABLE IF EXISTS raw.gtfs_stops_geom{suffix};
-            CREATE TABLE raw.gtfs_stops_geom{suffix} AS
-            SELECT s.*, ST_SetSRID(ST_MakePoint(s.stop_lon, s.stop_lat), 4326) AS geom
-            FROM raw.gtfs_stops{suffix} s
-            WHERE s.stop_lon IS NOT NULL AND s.stop_lat IS NOT NULL;
-
-            CREATE INDEX IF NOT EXISTS idx_gtfs_stops_geom{suffix}
-                ON raw.gtfs_stops_geom{suffix} USING GIST (geom);
-            CREATE INDEX IF NOT EXISTS idx_gtfs_trips_route{suffix}
-                ON raw.gtfs_trips{suffix}(route_id);
-            CREATE INDEX IF NOT EXISTS idx_gtfs_stop_times_trip{suffix}
-                ON raw.gtfs_stop_times{suffix}(trip_id);
-            CREATE INDEX IF NOT EXISTS idx_gtfs_stops_id{suffix}
-                ON raw.gtfs_stops{suffix}(stop_id);
-        """)
-    print(f"GTFS load complete → {zip_path}  (suffix: '{suffix or ''}')")
+    if prune:
+        for old in gtfs_store.superseded_loads(eng, load_id):
+            gtfs_store.drop_load(eng, old)
+    print(f"GTFS load complete → {zip_path}  ({mode} {version}, load {load_id})")
+    return load_id
 
 
 def main():
-    ap = argparse.ArgumentParser(description="Load a GTFS zip into Postgres (raw schema) with optional suffix.")
+    ap = argparse.ArgumentParser(description="Load a GTFS zip as a new feed version of one mode (raw schema).")
     ap.add_argument("--zip",     dest="zip_path", required=True, help="Path to GTFS zip")
-    ap.add_argument("--suffix",  default="", help="Suffix for table names (e.g., bus, fixed)")
+    ap.add_argument("--mode",    required=True, help="Mode in raw.gtfs_mode (e.g., bus, fixed)")
+    ap.add_argument("--version", required=True, help="Feed version label (e.g., 2024, 2025_03)")
+    ap.add_argument("--prune",   action="store_true", help="Drop earlier loads of the same mode and version")
+    ap.add_argument("--parser",  choices=PARSERS, default="arrow", help="CSV parse backend")
     args = ap.parse_args()
 
     load_dotenv()
     if not os.path.exists(args.zip_path):
         raise SystemExit(f"ZIP not found: {args.zip_path}")
-    load_zip(args.zip_path, args.suffix)
+    load_zip(args.zip_path, args.mode, args.version, prune=args.prune, parser=args.parser)
 
 
 if __name__ == "__main__":
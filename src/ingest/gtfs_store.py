@@ -0,0 +1,416 @@
+"""
+Feed-versioned, partitioned storage for the GTFS tables in the raw schema.
+
+Every GTFS table is a partitioned parent raw.gtfs_<kind>_p, LIST-partitioned by
+mode (raw.gtfs_<kind>_p_<mode>) and then by load (one partition per loaded feed
+version). raw.gtfs_feed records each load (mode, feed_version, source) and which
+load is current for its mode. The names the rest of the repo reads
+(raw.gtfs_stop_times_bus, raw.gtfs_trips_k_fixed, ...) are views over the current
+load, so create_gtfs_union_views.sql, the templates and the sql/ scripts are
+unchanged.
+
+A load fills standalone staging tables (raw.gtfs_<kind>_p_<mode>_<load_id>) that
+already carry the partition CHECK and the parent's indexes, then attaches them
+and moves the current pointer in one transaction. ATTACH only takes SHARE UPDATE
+EXCLUSIVE on the parent, so running queries are never blocked and see either the
+old or the new feed. Older loads stay queryable (pin_version) until dropped with
+DETACH ... CONCURRENTLY.
+
+Usage:
+  python -m src.ingest.gtfs_store init
+  python -m src.ingest.gtfs_store list
+  python -m src.ingest.gtfs_store use --mode bus --version 2024     # roll back the current pointer
+  python -m src.ingest.gtfs_store pin --version 2024                 # raw.gtfs_*_all_2024 views
+  python -m src.ingest.gtfs_store drop --load-id 7
+"""
+import re
+import argparse
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from dotenv import load_dotenv
+
+from src.config import make_engine
+
+UNION_VIEWS_SQL = Path(__file__).resolve().parents[2] / "sql" / "create_gtfs_union_views.sql"
+
+_VERSION = re.compile(r"^\w+$")
+
+_STOPS = [("stop_id", "text"), ("stop_code", "text"), ("stop_name", "text"),
+          ("stop_lat", "double precision"), ("stop_lon", "double precision"),
+          ("location_type", "bigint"), ("parent_station", "text")]
+
+# Data columns of every stored kind (mode and load_id are prepended by the parent).
+# The text kinds follow gtfs_load.DTYPES (types as to_sql would create them); columns
+# a feed does not have are NULL, columns outside this list are not stored.
+COLUMNS: dict[str, list[tuple[str, str]]] = {
+    "routes":         [("route_id", "text"), ("agency_id", "text"), ("route_short_name", "text"),
+                       ("route_long_name", "text"), ("route_type", "bigint"), ("route_color", "text")],
+    "trips":          [("route_id", "text"), ("service_id", "text"), ("trip_id", "text"),
+                       ("shape_id", "text"), ("direction_id", "bigint")],
+    "stop_times":     [("trip_id", "text"), ("arrival_time", "text"), ("departure_time", "text"),
+                       ("stop_id", "text"), ("stop_sequence", "bigint"), ("pickup_type", "bigint"),
+                       ("drop_off_type", "bigint")],
+    "stops":          _STOPS,
+    "calendar":       [("service_id", "text")]
+                      + [(d, "bigint") for d in ("monday", "tuesday", "wednesday", "thursday",
+                                                 "friday", "saturday", "sunday")]
+                      + [("start_date", "text"), ("end_date", "text")],
+    "calendar_dates": [("service_id", "text"), ("date", "text"), ("exception_type", "bigint")],
+    "shapes":         [("shape_id", "text"), ("shape_pt_lat", "double precision"),
+                       ("shape_pt_lon", "double precision"), ("shape_pt_sequence", "bigint")],
+    "stops_geom":     _STOPS + [("geom", "geometry(Point, 4326)")],
+    "route_dict":     [("route_key", "int4"), ("route_id", "text")],
+    "trip_dict":      [("trip_key", "int4"), ("trip_id", "text")],
+    "stop_dict":      [("stop_key", "int4"), ("stop_id", "text")],
+    "service_dict":   [("service_key", "int4"), ("service_id", "text")],
+    "trips_k":        [("trip_key", "int4"), ("route_key", "int4"), ("service_key", "int4"),
+                       ("direction_id", "smallint")],
+    "stop_times_k":   [("trip_key", "int4"), ("stop_sequence", "int4"), ("stop_key", "int4"),
+                       ("arrival_sec", "int4")],
+    "stops_k":        [("stop_key", "int4"), ("stop_lon", "double precision"),
+                       ("stop_lat", "double precision"), ("geom", "geometry(Point, 4326)")],
+}
+
+# Partitioned indexes on the parents; staging tables get the same definitions so
+# ATTACH adopts them instead of building them under lock.
+INDEXES: dict[str, list[str]] = {
+    "routes":       ["(route_id)"],
+    "trips":        ["(trip_id)", "(route_id)", "(service_id)"],
+    "stop_times":   ["(trip_id)", "(stop_id)"],
+    "stops":        ["(stop_id)"],
+    "stops_geom":   ["USING GIST (geom)"],
+    "route_dict":   ["(route_key)", "(route_id)"],
+    "trip_dict":    ["(trip_key)", "(trip_id)"],
+    "stop_dict":    ["(stop_key)", "(stop_id)"],
+    "service_dict": ["(service_key)", "(service_id)"],
+    "trips_k":      ["(trip_key)", "(service_key)"],
+    "stop_times_k": ["(trip_key)"],
+    "stops_k":      ["(stop_key)", "USING GIST (geom)"],
+}
+
+KINDS = tuple(COLUMNS)
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS raw.gtfs_mode (
+  mode       smallint PRIMARY KEY,
+  mode_name  text NOT NULL UNIQUE
+);
+INSERT INTO raw.gtfs_mode (mode, mode_name) VALUES (1, 'bus'), (2, 'fixed')
+ON CONFLICT (mode) DO NOTHING;
+
+CREATE TABLE IF NOT EXISTS raw.gtfs_feed (
+  load_id      serial PRIMARY KEY,
+  mode         smallint NOT NULL REFERENCES raw.gtfs_mode(mode),
+  feed_version text NOT NULL,
+  source       text,
+  loaded_at    timestamptz NOT NULL DEFAULT now(),
+  attached_at  timestamptz,
+  is_current   boolean NOT NULL DEFAULT false
+);
+CREATE UNIQUE INDEX IF NOT EXISTS gtfs_feed_current ON raw.gtfs_feed(mode) WHERE is_current;
+"""
+
+
+def parent(kind: str) -> str:
+    return f"raw.gtfs_{kind}_p"
+
+
+def mode_partition(kind: str, mode_name: str) -> str:
+    return f"raw.gtfs_{kind}_p_{mode_name}"
+
+
+def staging(kind: str, mode_name: str, load_id: int) -> str:
+    return f"raw.gtfs_{kind}_p_{mode_name}_{load_id}"
+
+
+def current_view(kind: str, mode_name: str) -> str:
+    return f"raw.gtfs_{kind}_{mode_name}"
+
+
+def _column_list(kind: str) -> str:
+    return ", ".join(c for c, _ in COLUMNS[kind])
+
+
+def modes(con) -> dict[str, int]:
+    rows = con.exec_driver_sql("SELECT mode_name, mode FROM raw.gtfs_mode ORDER BY mode").fetchall()
+    return {name: int(m) for name, m in rows}
+
+
+def ensure_schema(eng):
+    """
+    Create the registry, partitioned parents, per-mode partitions and the current-load
+    views (idempotent). Pre-partitioning tables that hold a view name are renamed to
+    <name>_legacy; reload those feeds with gtfs_load.
+    """
+    with eng.begin() as con:
+        con.exec_driver_sql(SCHEMA_SQL)
+        mode_ids = modes(con)
+        for kind in KINDS:
+            cols = ",\n  ".join(f"{c} {t}" for c, t in COLUMNS[kind])
+            con.exec_driver_sql(f"""
+                CREATE TABLE IF NOT EXISTS {parent(kind)} (
+                  mode smallint NOT NULL,
+                  load_id int4 NOT NULL,
+                  {cols}
+                ) PARTITION BY LIST (mode)""")
+            for ix in INDEXES.get(kind, []):
+                name = f"gtfs_{kind}_p_" + re.sub(r"\W+", "_", ix.lower()).strip("_")
+                con.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {name} ON {parent(kind)} {ix}")
+            for mode_name, m in mode_ids.items():
+                con.exec_driver_sql(f"""
+                    CREATE TABLE IF NOT EXISTS {mode_partition(kind, mode_name)}
+                    PARTITION OF {parent(kind)} FOR VALUES IN ({m})
+                    PARTITION BY LIST (load_id)""")
+                view = current_view(kind, mode_name)
+                relkind = con.exec_driver_sql(
+                    "SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (view,)).scalar()
+                if relkind == "r":
+                    legacy = view.split(".", 1)[1] + "_legacy"
+                    con.exec_driver_sql(f"ALTER TABLE {view} RENAME TO {legacy}")
+                    print(f"[warn] {view} was a plain table; renamed to raw.{legacy}")
+                # The scalar subquery is an InitPlan, so only the current load's
+                # partition is scanned (runtime partition pruning).
+                con.exec_driver_sql(f"""
+                    CREATE OR REPLACE VIEW {view} AS
+                    SELECT {_column_list(kind)}
+                    FROM {parent(kind)}
+                    WHERE mode = {m}
+                      AND load_id = (SELECT load_id FROM raw.gtfs_feed WHERE mode = {m} AND is_current)""")
+    create_union_views(eng)
+
+
+def create_union_views(eng):
+    """
+    (Re)create the raw.gtfs_*_all views from sql/create_gtfs_union_views.sql.
+    """
+    with eng.begin() as con:
+        con.exec_driver_sql(UNION_VIEWS_SQL.read_text(encoding="utf-8-sig"))
+
+
+def begin_load(eng, mode_name: str, feed_version: str, source: str | None = None) -> int:
+    """
+    Register a load and create its empty staging tables (one per kind). The staging
+    tables default mode/load_id, so writers only supply the GTFS columns.
+    """
+    if not _VERSION.match(feed_version):
+        raise ValueError(f"feed version must be [A-Za-z0-9_]+, got {feed_version!r}")
+    with eng.begin() as con:
+        mode_ids = modes(con)
+        if mode_name not in mode_ids:
+            raise ValueError(f"unknown mode {mode_name!r}; expected one of {sorted(mode_ids)}")
+        m = mode_ids[mode_name]
+        load_id = con.exec_driver_sql(
+            "INSERT INTO raw.gtfs_feed (mode, feed_version, source) VALUES (%s, %s, %s) RETURNING load_id",
+            (m, feed_version, source)).scalar()
+        for kind in KINDS:
+            t = staging(kind, mode_name, load_id)
+            con.exec_driver_sql(f"""
+                CREATE TABLE {t} (LIKE {parent(kind)} INCLUDING DEFAULTS);
+                ALTER TABLE {t}
+                  ALTER COLUMN mode SET DEFAULT {m},
+                  ALTER COLUMN load_id SET DEFAULT {load_id},
+                  ADD CONSTRAINT {t.split('.', 1)[1]}_part CHECK (mode = {m} AND load_id = {load_id})""")
+    print(f"[ok] load {load_id}: {mode_name} {feed_version} → raw.gtfs_*_p_{mode_name}_{load_id}")
+    return load_id
+
+
+def load_info(con, load_id: int) -> tuple[str, int, str]:
+    row = con.exec_driver_sql("""
+        SELECT m.mode_name, f.mode, f.feed_version
+        FROM raw.gtfs_feed f JOIN raw.gtfs_mode m USING (mode)
+        WHERE f.load_id = %s""", (load_id,)).fetchone()
+    if row is None:
+        raise ValueError(f"no such load: {load_id}")
+    return row[0], int(row[1]), row[2]
+
+
+def _autocommit(eng, sql: str):
+    with eng.connect() as con:
+        con.execution_options(isolation_level="AUTOCOMMIT").exec_driver_sql(sql)
+
+
+def index_staging(eng, load_id: int, kinds=KINDS, workers: int = 1):
+    """
+    Build the parent's index definitions on the staging tables and ANALYZE them,
+    while they are still detached. With workers > 1 the CREATE INDEX statements run
+    concurrently on separate connections (they only take SHARE locks).
+    """
+    with eng.connect() as con:
+        mode_name, _, _ = load_info(con, load_id)
+    tables = {kind: staging(kind, mode_name, load_id) for kind in kinds}
+    stmts = [f"CREATE INDEX ON {t} {ix}" for kind, t in tables.items() for ix in INDEXES.get(kind, [])]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        list(pool.map(lambda sql: _autocommit(eng, sql), stmts))
+        list(pool.map(lambda t: _autocommit(eng, f"ANALYZE {t}"), tables.values()))
+
+
+def attach_load(eng, load_id: int, make_current: bool = True):
+    attach_loads(eng, [load_id], make_current=make_current)
+
+
+def attach_loads(eng, load_ids: list[int], make_current: bool = True):
+    """
+    Attach every staging table of the given loads and (optionally) make each the
+    current load of its mode, all in one transaction.
+    """
+    with eng.begin() as con:
+        infos = {load_id: load_info(con, load_id) for load_id in load_ids}
+        if make_current and len({m for _, m, _ in infos.values()}) < len(infos):
+            raise ValueError(f"several loads of one mode cannot all become current: {load_ids}")
+        for load_id, (mode_name, m, _) in infos.items():
+            for kind in KINDS:
+                con.exec_driver_sql(
+                    f"ALTER TABLE {mode_partition(kind, mode_name)} "
+                    f"ATTACH PARTITION {staging(kind, mode_name, load_id)} FOR VALUES IN ({load_id})")
+            con.exec_driver_sql("UPDATE raw.gtfs_feed SET attached_at = now() WHERE load_id = %s", (load_id,))
+            if make_current:
+                _set_current(con, m, load_id)
+    for load_id, (mode_name, _, feed_version) in infos.items():
+        print(f"[ok] attached load {load_id} ({mode_name} {feed_version})"
+              + (" as current" if make_current else ""))
+
+
+def analyze(eng, workers: int = 1):
+    """
+    Refresh parent-level statistics of every partitioned GTFS table.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        list(pool.map(lambda kind: _autocommit(eng, f"ANALYZE {parent(kind)}"), KINDS))
+
+
+def _set_current(con, mode: int, load_id: int):
+    con.exec_driver_sql("UPDATE raw.gtfs_feed SET is_current = false WHERE mode = %s AND is_current", (mode,))
+    con.exec_driver_sql("UPDATE raw.gtfs_feed SET is_current = true WHERE load_id = %s", (load_id,))
+
+
+def use_version(eng, mode_name: str, feed_version: str):
+    """
+    Point the current views of a mode at the latest attached load of feed_version.
+    """
+    with eng.begin() as con:
+        load_id = con.exec_driver_sql("""
+            SELECT f.load_id FROM raw.gtfs_feed f JOIN raw.gtfs_mode m USING (mode)
+            WHERE m.mode_name = %s AND f.feed_version = %s AND f.attached_at IS NOT NULL
+            ORDER BY f.load_id DESC LIMIT 1""", (mode_name, feed_version)).scalar()
+        if load_id is None:
+            raise ValueError(f"no attached load of {mode_name} {feed_version}")
+        _, m, _ = load_info(con, load_id)
+        _set_current(con, m, load_id)
+    print(f"[ok] {mode_name} → {feed_version} (load {load_id})")
+
+
+def drop_load(eng, load_id: int):
+    """
+    Remove a non-current load. Attached partitions are detached CONCURRENTLY (waits
+    for queries still reading them, blocks nobody) and then dropped.
+    """
+    with eng.connect() as con:
+        con = con.execution_options(isolation_level="AUTOCOMMIT")
+        mode_name, _, feed_version = load_info(con, load_id)
+        current, attached = con.exec_driver_sql(
+            "SELECT is_current, attached_at IS NOT NULL FROM raw.gtfs_feed WHERE load_id = %s",
+            (load_id,)).fetchone()
+        if current:
+            raise ValueError(f"load {load_id} is current for {mode_name}; switch with `use` first")
+        for kind in KINDS:
+            t = staging(kind, mode_name, load_id)
+            if con.exec_driver_sql("SELECT to_regclass(%s)", (t,)).scalar() is None:
+                continue
+            if attached:
+                con.exec_driver_sql(
+                    f"ALTER TABLE {mode_partition(kind, mode_name)} DETACH PARTITION {t} CONCURRENTLY")
+            con.exec_driver_sql(f"DROP TABLE {t}")
+        con.exec_driver_sql("DELETE FROM raw.gtfs_feed WHERE load_id = %s", (load_id,))
+    print(f"[ok] dropped load {load_id} ({mode_name} {feed_version})")
+
+
+def superseded_loads(eng, load_id: int) -> list[int]:
+    """
+    Older, non-current loads of the same mode and feed version as load_id.
+    """
+    with eng.connect() as con:
+        return [int(x) for (x,) in con.exec_driver_sql("""
+            SELECT o.load_id FROM raw.gtfs_feed o
+            JOIN raw.gtfs_feed f ON f.mode = o.mode AND f.feed_version = o.feed_version
+            WHERE f.load_id = %s AND o.load_id < f.load_id AND NOT o.is_current
+            ORDER BY o.load_id""", (load_id,)).fetchall()]
+
+
+def pin_version(eng, feed_version: str):
+    """
+    Create raw.gtfs_<kind>_<mode>_<version> and raw.gtfs_*_all_<version> views over the
+    latest load of feed_version per mode, i.e. the names QueryParams(feed="_<version>")
+    renders (runner --feed _<version>).
+    """
+    if not _VERSION.match(feed_version):
+        raise ValueError(f"feed version must be [A-Za-z0-9_]+, got {feed_version!r}")
+    v = feed_version
+    pinned = (f"(SELECT max(load_id) FROM raw.gtfs_feed "
+              f"WHERE mode = {{m}} AND feed_version = '{v}' AND attached_at IS NOT NULL)")
+    with eng.begin() as con:
+        mode_ids = modes(con)
+        for kind in KINDS:
+            cols = _column_list(kind)
+            for mode_name, m in mode_ids.items():
+                con.exec_driver_sql(f"""
+                    CREATE OR REPLACE VIEW {current_view(kind, mode_name)}_{v} AS
+                    SELECT {cols} FROM {parent(kind)}
+                    WHERE mode = {m} AND load_id = {pinned.format(m=m)}""")
+            # Keyed and dictionary kinds: same shape as the *_k_all / *_dict_all views.
+            if kind.endswith(("_k", "_dict")):
+                con.exec_driver_sql(f"""
+                    CREATE OR REPLACE VIEW raw.gtfs_{kind}_all_{v} AS
+                    """ + "\nUNION ALL\n".join(
+                        f"SELECT mode, {cols} FROM {parent(kind)} "
+                        f"WHERE mode = {m} AND load_id = {pinned.format(m=m)}"
+                        for m in mode_ids.values()))
+        con.exec_driver_sql(f"""
+            CREATE OR REPLACE VIEW raw.gtfs_routes_all_{v} AS
+            SELECT r.route_id, r.agency_id, r.route_short_name, r.route_long_name, r.route_type,
+                   m.mode_name AS mode
+            FROM {parent('routes')} r JOIN raw.gtfs_mode m ON m.mode = r.mode
+            WHERE r.load_id IN (SELECT max(load_id) FROM raw.gtfs_feed
+                                WHERE feed_version = '{v}' AND attached_at IS NOT NULL GROUP BY mode)""")
+    print(f"[ok] pinned views raw.gtfs_*_{v} (query with --feed _{v})")
+
+
+def list_loads(eng) -> pd.DataFrame:
+    return pd.read_sql("""
+        SELECT f.load_id, m.mode_name AS mode, f.feed_version, f.source, f.loaded_at,
+               f.attached_at, f.is_current
+        FROM raw.gtfs_feed f JOIN raw.gtfs_mode m USING (mode)
+        ORDER BY m.mode, f.load_id""", eng)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Manage feed-versioned GTFS partitions.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("init", help="Create registry, partitioned tables and current views")
+    sub.add_parser("list", help="List loads")
+    p = sub.add_parser("use", help="Make a loaded feed version current for a mode")
+    p.add_argument("--mode", required=True)
+    p.add_argument("--version", required=True)
+    p = sub.add_parser("pin", help="Create raw.gtfs_*_<version> views for a feed version")
+    p.add_argument("--version", required=True)
+    p = sub.add_parser("drop", help="Detach and drop a non-current load")
+    p.add_argument("--load-id", type=int, required=True)
+    args = ap.parse_args()
+
+    load_dotenv()
+    eng = make_engine()
+    if args.cmd == "init":
+        ensure_schema(eng)
+    elif args.cmd == "list":
+        print(list_loads(eng).to_string(index=False))
+    elif args.cmd == "use":
+        use_version(eng, args.mode, args.version)
+    elif args.cmd == "pin":
+        pin_version(eng, args.version)
+    elif args.cmd == "drop":
+        drop_load(eng, args.load_id)
+
+
+if __name__ == "__main__":
+    main()
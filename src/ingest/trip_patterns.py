@@ -0,0 +1,378 @@
+"""
+Compact in-memory model of GTFS stop_times built from trip patterns.
+
+Most trips repeat a stop sequence with only a shifted start time. Instead of one
+row of strings per (trip, stop), the model keeps:
+  - stop patterns: unique stop sequences as int32 stop codes (CSR arrays)
+  - patterns:      a stop pattern plus a relative time vector (int32 seconds after
+                   the trip's first timed stop; NO_TIME where a stop has no arrival)
+  - per trip:      pattern, route and service codes (int32) and start second
+Original ids live once in dictionaries. (stop, sec) rows are expanded lazily and
+only for trips that can reach the requested window, so headways and exports run
+on the model directly.
+
+Usage:
+  python -m src.ingest.trip_patterns --zip data/gtfs_bus.zip --mode bus --save data/patterns/bus.npz
+  python -m src.ingest.trip_patterns --load data/patterns/bus.npz --window 7-10 --services WKD \
+      --route-medians docs/bus_route_medians_07_10.csv
+  python -m src.ingest.trip_patterns --load data/patterns/bus.npz --window 7-10 --arrivals arrivals.parquet
+"""
+import re
+import zipfile
+import argparse
+from pathlib import Path
+from dataclasses import dataclass, fields
+
+import numpy as np
+import pandas as pd
+import sqlalchemy as sa
+
+from src.ingest.gtfs_load import DTYPES, read_member, iter_stop_times_chunks
+from src.queries.runner import parse_list, parse_window
+
+NO_TIME = np.iinfo(np.int32).min
+DAY = 86400
+_HMS = r"^([0-9]+):([0-9]{2}):([0-9]{2})$"
+_SUFFIX = re.compile(r"^\w*$")
+
+
+def parse_seconds(s: pd.Series) -> np.ndarray:
+    """
+    GTFS HH:MM:SS (hours may exceed 24) → int32 seconds; anything else → NO_TIME.
+    Same rule as the SQL templates.
+    """
+    hms = s.astype("string").str.extract(_HMS).apply(pd.to_numeric)
+    sec = hms[0] * 3600 + hms[1] * 60 + hms[2]
+    return sec.fillna(NO_TIME).to_numpy(dtype=np.int64).astype(np.int32)
+
+
+class _Codes:
+    """Growing dictionary of string ids → dense int32 codes (-1 for missing)."""
+
+    def __init__(self):
+        self.index = pd.Index([], dtype=object)
+
+    def encode(self, s: pd.Series) -> np.ndarray:
+        v = s.astype("string")
+        ok = v.notna().to_numpy()
+        vals = v[ok].to_numpy(dtype=object)
+        codes = np.full(len(v), -1, dtype=np.int32)
+        idx = self.index.get_indexer(vals)
+        new = pd.unique(vals[idx < 0])
+        if len(new):
+            self.index = self.index.append(pd.Index(new, dtype=object))
+            idx = self.index.get_indexer(vals)
+        codes[ok] = idx
+        return codes
+
+    @property
+    def values(self) -> np.ndarray:
+        return self.index.to_numpy(dtype=object)
+
+
+def _lookup(ids: np.ndarray, values) -> np.ndarray:
+    """Codes of the given ids in a dictionary; unknown ids are dropped."""
+    idx = pd.Index(ids).get_indexer(list(values))
+    return idx[idx >= 0]
+
+
+@dataclass(eq=False)
+class TripPatterns:
+    mode: str
+    stop_ids: np.ndarray          # dictionaries (object arrays of str)
+    route_ids: np.ndarray
+    service_ids: np.ndarray
+    trip_ids: np.ndarray
+    trip_route: np.ndarray        # int32 per trip
+    trip_service: np.ndarray      # int32 per trip
+    trip_pattern: np.ndarray      # int32 per trip, -1 = no stop_times
+    trip_start: np.ndarray        # int32 per trip, seconds of the first timed stop
+    sp_ptr: np.ndarray            # int64 CSR offsets into sp_stops, per stop pattern
+    sp_stops: np.ndarray          # int32 stop codes
+    pat_stop_pattern: np.ndarray  # int32 per pattern
+    pat_ptr: np.ndarray           # int64 CSR offsets into pat_times, per pattern
+    pat_times: np.ndarray         # int32 relative seconds (NO_TIME = no arrival)
+    pat_span: np.ndarray          # int32 (n_patterns, 2): min/max relative second
+    source_bytes: int = 0         # deep size of the long-format frame it replaced
+
+    # ---- construction -------------------------------------------------------
+    @classmethod
+    def from_frames(cls, trips: pd.DataFrame, chunks, *, mode: str = "") -> "TripPatterns":
+        """
+        trips: trip_id, route_id, service_id. chunks: iterable of stop_times frames
+        (trip_id, arrival_time, stop_id, stop_sequence). Rows whose trip or stop is
+        unknown are dropped, like the inner joins in the SQL.
+        """
+        trips = trips.dropna(subset=["trip_id", "route_id", "service_id"]).drop_duplicates("trip_id")
+        trip_codes, route_codes, service_codes, stop_codes = _Codes(), _Codes(), _Codes(), _Codes()
+        trip_codes.encode(trips["trip_id"])
+        trip_route = route_codes.encode(trips["route_id"])
+        trip_service = service_codes.encode(trips["service_id"])
+        n_trips = len(trips)
+
+        parts, source_bytes = [], 0
+        for ch in chunks:
+            source_bytes += int(ch.memory_usage(deep=True).sum())
+            t = trip_codes.index.get_indexer(ch["trip_id"].astype("string").to_numpy(dtype=object))
+            s = stop_codes.encode(ch["stop_id"])
+            keep = (t >= 0) & (s >= 0)
+            seq = pd.to_numeric(ch["stop_sequence"], errors="coerce").fillna(-1).to_numpy(dtype=np.int64)
+            parts.append((t[keep].astype(np.int32), s[keep], seq[keep], parse_seconds(ch["arrival_time"])[keep]))
+        if not parts:
+            raise ValueError("no stop_times rows")
+        trip, stop, seq, sec = (np.concatenate(c) for c in zip(*parts))
+        del parts
+
+        order = np.lexsort((seq, trip))
+        trip, stop, sec = trip[order], stop[order], sec[order]
+        del seq, order
+
+        starts = np.flatnonzero(np.r_[True, trip[1:] != trip[:-1]]) if len(trip) else np.empty(0, np.int64)
+        lengths = np.diff(np.r_[starts, len(trip)])
+        timed = sec != NO_TIME
+        first = np.minimum.reduceat(np.where(timed, sec, np.iinfo(np.int32).max), starts) if len(starts) else starts
+        first = np.where(first == np.iinfo(np.int32).max, 0, first).astype(np.int32)
+        rel = np.where(timed, sec - np.repeat(first, lengths), NO_TIME).astype(np.int32)
+
+        trip_pattern = np.full(n_trips, -1, dtype=np.int32)
+        trip_start = np.zeros(n_trips, dtype=np.int32)
+        trip_start[trip[starts]] = first
+        patterns: dict[tuple[bytes, bytes], int] = {}
+        stop_patterns: dict[bytes, int] = {}
+        pat_sp = []
+        for a, b in zip(starts, starts + lengths):
+            sk = stop[a:b].tobytes()
+            key = (sk, rel[a:b].tobytes())
+            p = patterns.get(key)
+            if p is None:
+                p = patterns[key] = len(patterns)
+                pat_sp.append(stop_patterns.setdefault(sk, len(stop_patterns)))
+            trip_pattern[trip[a]] = p
+
+        sp_arrays = [np.frombuffer(k, dtype=np.int32) for k in stop_patterns]
+        pt_arrays = [np.frombuffer(k[1], dtype=np.int32) for k in patterns]
+        span = np.array([[v[v != NO_TIME].min(initial=0), v[v != NO_TIME].max(initial=0)] for v in pt_arrays],
+                        dtype=np.int32).reshape(-1, 2)
+        return cls(
+            mode=mode,
+            stop_ids=stop_codes.values, route_ids=route_codes.values,
+            service_ids=service_codes.values, trip_ids=trip_codes.values,
+            trip_route=trip_route, trip_service=trip_service,
+            trip_pattern=trip_pattern, trip_start=trip_start,
+            sp_ptr=np.r_[0, np.cumsum([len(v) for v in sp_arrays])].astype(np.int64),
+            sp_stops=np.concatenate(sp_arrays).astype(np.int32) if sp_arrays else np.empty(0, np.int32),
+            pat_stop_pattern=np.asarray(pat_sp, dtype=np.int32),
+            pat_ptr=np.r_[0, np.cumsum([len(v) for v in pt_arrays])].astype(np.int64),
+            pat_times=np.concatenate(pt_arrays).astype(np.int32) if pt_arrays else np.empty(0, np.int32),
+            pat_span=span,
+            source_bytes=source_bytes,
+        )
+
+    @classmethod
+    def from_zip(cls, zip_path: str, *, mode: str = "") -> "TripPatterns":
+        with zipfile.ZipFile(zip_path, "r") as zf:
+            trips = read_member(zf, "trips.txt", DTYPES["trips"])
+            if trips is None or "stop_times.txt" not in zf.namelist():
+                raise SystemExit(f"{zip_path}: needs trips.txt and stop_times.txt")
+            return cls.from_frames(trips, iter_stop_times_chunks(zf, "stop_times.txt"), mode=mode)
+
+    @classmethod
+    def from_db(cls, suffix: str, *, engine=None, chunksize: int = 200_000) -> "TripPatterns":
+        """
+        Build from raw.gtfs_trips<suffix> / raw.gtfs_stop_times<suffix>, streamed.
+        The suffix without its leading underscore is used as the mode ("_bus" → "bus").
+        """
+        if not _SUFFIX.match(suffix):
+            raise ValueError(f"suffix must be [A-Za-z0-9_]*, got {suffix!r}")
+        from src.config import get_engine
+        eng = engine or get_engine()
+        with eng.connect() as con:
+            trips = pd.read_sql(f"SELECT trip_id, route_id, service_id FROM raw.gtfs_trips{suffix}", con,
+                                dtype={k: DTYPES["trips"][k] for k in ("trip_id", "route_id", "service_id")})
+            chunks = pd.read_sql(
+                sa.text(f"SELECT trip_id, arrival_time, stop_id, stop_sequence FROM raw.gtfs_stop_times{suffix}"),
+                con.execution_options(stream_results=True), chunksize=chunksize,
+                dtype={k: DTYPES["stop_times"][k] for k in ("trip_id", "arrival_time", "stop_id", "stop_sequence")})
+            return cls.from_frames(trips, chunks, mode=suffix.lstrip("_"))
+
+    # ---- persistence --------------------------------------------------------
+    def save(self, path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        arrays = {f.name: getattr(self, f.name) for f in fields(self)}
+        for k in ("stop_ids", "route_ids", "service_ids", "trip_ids"):
+            arrays[k] = np.asarray(arrays[k], dtype=str)
+        tmp = path.with_name(path.name + ".part")
+        with open(tmp, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path) -> "TripPatterns":
+        with np.load(path) as z:
+            kw = {f.name: z[f.name] for f in fields(cls)}
+        for k in ("stop_ids", "route_ids", "service_ids", "trip_ids"):
+            kw[k] = kw[k].astype(object)
+        kw["mode"] = str(kw["mode"])
+        kw["source_bytes"] = int(kw["source_bytes"])
+        return cls(**kw)
+
+    # ---- size ---------------------------------------------------------------
+    @property
+    def nbytes(self) -> int:
+        n = 0
+        for f in fields(self):
+            v = getattr(self, f.name)
+            if isinstance(v, np.ndarray):
+                n += int(pd.Series(v).memory_usage(deep=True, index=False)) if v.dtype == object else v.nbytes
+        return n
+
+    def pattern_lengths(self) -> np.ndarray:
+        return np.diff(self.sp_ptr)[self.pat_stop_pattern]
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "trips": len(self.trip_ids),
+            "stop_times": int(self.pattern_lengths()[self.trip_pattern[self.trip_pattern >= 0]].sum()),
+            "stop_patterns": len(self.sp_ptr) - 1,
+            "patterns": len(self.pat_ptr) - 1,
+            "model_mb": round(self.nbytes / 2**20, 1),
+            "long_format_mb": round(self.source_bytes / 2**20, 1),
+        }
+
+    # ---- lazy expansion -----------------------------------------------------
+    def select_trips(self, window: tuple[int, int] | None = None, services=None) -> np.ndarray:
+        """
+        Trip codes running one of the services whose span can reach the window
+        (hours [start, end), folded by 24 h like the SQL).
+        """
+        if len(self.pat_span) == 0:  # no trip has stop times
+            return np.empty(0, dtype=np.int32)
+        mask = self.trip_pattern >= 0
+        if services is not None:
+            mask &= np.isin(self.trip_service, _lookup(self.service_ids, services))
+        if window is not None:
+            s, e = window[0] * 3600, window[1] * 3600 - 1
+            p = np.where(self.trip_pattern >= 0, self.trip_pattern, 0)
+            lo = self.trip_start.astype(np.int64) + self.pat_span[p, 0]
+            hi = self.trip_start.astype(np.int64) + self.pat_span[p, 1]
+            hit = np.zeros_like(mask)
+            for k in range(int(hi.max(initial=0)) // DAY + 1):
+                hit |= (lo <= e + k * DAY) & (hi >= s + k * DAY)
+            mask &= hit
+        return np.flatnonzero(mask).astype(np.int32)
+
+    def expand(self, trips: np.ndarray):
+        """(trip, stop, sec) arrays for the given trip codes; sec is int64, NO_TIME rows dropped."""
+        p = self.trip_pattern[trips]
+        sp = self.pat_stop_pattern[p]
+        n = self.sp_ptr[sp + 1] - self.sp_ptr[sp]
+        within = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+        rep = np.repeat(np.arange(len(trips)), n)
+        stop = self.sp_stops[np.repeat(self.sp_ptr[sp], n) + within]
+        rel = self.pat_times[np.repeat(self.pat_ptr[p], n) + within]
+        ok = rel != NO_TIME
+        sec = self.trip_start[trips][rep].astype(np.int64) + rel
+        return trips[rep][ok], stop[ok], sec[ok]
+
+    def _window_rows(self, trips: np.ndarray, window: tuple[int, int], stops=None):
+        trip, stop, sec = self.expand(trips)
+        s, e = window[0] * 3600, window[1] * 3600 - 1
+        keep = ((sec % DAY) >= s) & ((sec % DAY) <= e)
+        if stops is not None:
+            keep &= np.isin(stop, _lookup(self.stop_ids, stops))
+        return trip[keep], stop[keep], sec[keep]
+
+    def arrivals(self, window: tuple[int, int], services=None, stops=None, *, decode: bool = True) -> pd.DataFrame:
+        """
+        Arrivals with (sec % 86400) in [start, end) of the window. stops optionally
+        restricts to a set of stop_ids (e.g. those inside the region).
+        """
+        trip, stop, sec = self._window_rows(self.select_trips(window, services), window, stops)
+        route = self.trip_route[trip]
+        if not decode:
+            return pd.DataFrame({"trip": trip, "route": route, "stop": stop, "sec": sec})
+        return pd.DataFrame({
+            "trip_id": pd.Categorical.from_codes(trip, categories=self.trip_ids),
+            "route_id": pd.Categorical.from_codes(route, categories=self.route_ids),
+            "stop_id": pd.Categorical.from_codes(stop, categories=self.stop_ids),
+            "sec": sec,
+        })
+
+    def iter_arrival_batches(self, window: tuple[int, int], services=None, stops=None,
+                             batch_size: int = 50_000):
+        """(columns, rows) batches for src.queries.export.write_batches; expands one slice of trips at a time."""
+        trips = self.select_trips(window, services)
+        rows = int(self.pattern_lengths()[self.trip_pattern[trips]].sum())
+        columns = ["mode", "trip_id", "route_id", "stop_id", "sec"]
+        for part in np.array_split(trips, max(1, -(-rows // batch_size))):
+            trip, stop, sec = self._window_rows(part, window, stops)
+            yield columns, list(zip([self.mode] * len(trip), self.trip_ids[trip],
+                                    self.route_ids[self.trip_route[trip]],
+                                    self.stop_ids[stop], sec.tolist()))
+
+    # ---- headways -----------------------------------------------------------
+    def route_medians(self, window: tuple[int, int], services=None, stops=None) -> pd.DataFrame:
+        """
+        Route median headway for one service day, as in _route_day_median.sql:
+        per (route, stop) successive arrival gaps in (0, 3600] s, median per route.
+        Returns mode, route_id, med_sec.
+        """
+        a = self.arrivals(window, services, stops, decode=False)
+        r, s, t = a["route"].to_numpy(), a["stop"].to_numpy(), a["sec"].to_numpy()
+        order = np.lexsort((t, s, r))
+        r, s, t = r[order], s[order], t[order]
+        dh = np.diff(t)
+        ok = (r[1:] == r[:-1]) & (s[1:] == s[:-1]) & (dh > 0) & (dh <= 3600)
+        med = pd.Series(dh[ok].astype(float)).groupby(r[1:][ok]).median()
+        return pd.DataFrame({"mode": self.mode, "route_id": self.route_ids[med.index.to_numpy()],
+                             "med_sec": med.to_numpy()})
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Build / query the compact trip-pattern model of stop_times.")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--zip", dest="zip_path", help="GTFS zip to build from")
+    src.add_argument("--suffix", help="Build from raw.gtfs_*<suffix> in the DB (e.g. _bus)")
+    src.add_argument("--load", help="Saved model (.npz)")
+    ap.add_argument("--mode", default="", help="Mode label when building from a zip (bus, fixed)")
+    ap.add_argument("--save", help="Write the model to this .npz")
+    ap.add_argument("--window", default=None, help="Hours, e.g. 7-10")
+    ap.add_argument("--services", default="", help="Comma-separated service_ids (default: all)")
+    ap.add_argument("--route-medians", help="CSV of route median headways in the window")
+    ap.add_argument("--arrivals", help="Export expanded arrivals (.csv, .parquet)")
+    args = ap.parse_args()
+
+    if args.load:
+        model = TripPatterns.load(args.load)
+    elif args.zip_path:
+        model = TripPatterns.from_zip(args.zip_path, mode=args.mode)
+    else:
+        model = TripPatterns.from_db(args.suffix)
+    print("[patterns]", model.stats())
+    if args.save:
+        model.save(args.save)
+        print(f"Saved {args.save}")
+
+    if not (args.route_medians or args.arrivals):
+        return
+    if not args.window:
+        raise SystemExit("--window is required for --route-medians / --arrivals")
+    window = parse_window(args.window)
+    services = parse_list(args.services) or None
+
+    if args.route_medians:
+        rm = model.route_medians(window, services)
+        rm["med_minutes"] = (rm.pop("med_sec") / 60.0).round(2)
+        Path(args.route_medians).parent.mkdir(parents=True, exist_ok=True)
+        rm.to_csv(args.route_medians, index=False)
+        print(f"Saved {args.route_medians} ({len(rm):,} routes)")
+    if args.arrivals:
+        from src.queries.export import write_batches
+        n = write_batches(model.iter_arrival_batches(window, services), Path(args.arrivals))
+        print(f"Saved {args.arrivals} ({n:,} rows)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Daily network and route headway series for every day of a feed's validity.
+
+A day's headways depend only on the timetables of the services active that day.
+Each (mode, service_id) gets a timetable fingerprint (one scan of stop_times,
+cached), each day gets the fingerprint of its multiset of active timetables, and
+days with the same service-set fingerprint share one computation. Only one
+representative date per distinct set goes through route_day_medians; the result
+is then mapped back onto every day of that set. A full year of a regular feed
+reduces to a handful of distinct sets (weekday / Saturday / Sunday per period,
+plus holidays).
+
+Outputs (one row per day × window, and per day × window × route):
+  docs/t3_daily_network.csv      day, window, service_set, routes, p25_min, p50_min, p75_min
+  docs/t3_daily_routes.csv.gz    day, window, mode, route_id, med_minutes
+
+Usage:
+  python -m src.queries.daily_series --window 7-10 --window 16-19
+  python -m src.queries.daily_series --start 2024-07-01 --end 2024-07-31 --modes bus
+"""
+import hashlib
+import argparse
+import datetime as dt
+from pathlib import Path
+from dataclasses import replace
+
+import pandas as pd
+
+from src.queries.runner import QueryParams, run, parse_list, parse_window
+
+NETWORK_OUT = "docs/t3_daily_network.csv"
+ROUTES_OUT = "docs/t3_daily_routes.csv.gz"
+
+
+def feed_validity(params: QueryParams, **kw) -> tuple[dt.date, dt.date]:
+    row = run("feed_validity", params, **kw).iloc[0]
+    if pd.isna(row["start_date"]):
+        raise SystemExit("Feed has no calendar / calendar_dates entries.")
+    return pd.Timestamp(row["start_date"]).date(), pd.Timestamp(row["end_date"]).date()
+
+
+def service_sets(params: QueryParams, start: dt.date, end: dt.date, **kw) -> pd.DataFrame:
+    """
+    One row per day in [start, end]: day, service_set (fingerprint of the day's
+    timetable multiset; "" when nothing runs) and rep_day (first day with that set).
+    Services without trips carry no timetable and are ignored.
+    """
+    days = pd.date_range(start, end, freq="D").strftime("%Y-%m-%d")
+    dated = replace(params, dates=tuple(dt.date.fromisoformat(d) for d in days))
+    active = run("service_days", dated, **kw)
+    fps = run("service_fingerprints", params, **kw)
+
+    active = active.merge(fps, on=["mode", "service_id"], how="inner")
+    # No groupby.apply: it cannot build a Series when no service runs in the range.
+    grouped = active.sort_values(["day", "mode", "fingerprint"]).groupby("day", sort=True)
+    sets = pd.Series({day: hashlib.sha1("\n".join(g["mode"] + ":" + g["fingerprint"]).encode()).hexdigest()[:16]
+                      for day, g in grouped}, name="service_set", dtype=str)
+
+    out = pd.DataFrame({"day": days}).merge(sets, left_on="day", right_index=True, how="left")
+    out["service_set"] = out["service_set"].fillna("")
+    out["rep_day"] = out.groupby("service_set")["day"].transform("first")
+    return out
+
+
+def network_percentiles(sets: pd.DataFrame, rdm: pd.DataFrame) -> pd.DataFrame:
+    """
+    sets (day, service_set, rep_day) with routes and p25/p50/p75 of the route medians
+    of its rep_day (rdm: rep_day, med_sec). Days without medians get routes=0, NaN.
+    """
+    med = pd.to_numeric(rdm["med_sec"], errors="coerce").astype(float)
+    q = (med.groupby(rdm["rep_day"])
+            .quantile([0.25, 0.5, 0.75])                  # linear = percentile_cont
+            .unstack()
+            .reindex(columns=[0.25, 0.5, 0.75])           # empty input has no columns
+            .div(60.0).round(2)
+            .set_axis(["p25_min", "p50_min", "p75_min"], axis=1))
+    q["routes"] = rdm.groupby("rep_day").size()
+
+    net = sets.merge(q, left_on="rep_day", right_index=True, how="left")
+    net["routes"] = net["routes"].fillna(0).astype(int)
+    return net
+
+
+def daily_series(params: QueryParams, start: dt.date, end: dt.date,
+                 windows: list[tuple[int, int]], **kw) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Return (network, routes) for every day in [start, end] and every window.
+    route_day_medians runs once per window, over the representative dates only.
+    """
+    sets = service_sets(params, start, end, **kw)
+    reps = sorted(set(sets.loc[sets["service_set"] != "", "rep_day"]))
+    print(f"[daily] {len(sets)} days → {len(reps)} distinct service sets")
+
+    net_frames, route_frames = [], []
+    for window in windows:
+        p = replace(params, dates=tuple(dt.date.fromisoformat(d) for d in reps), window=window)
+        rdm = run("route_day_medians", p, **kw) if reps else \
+            pd.DataFrame(columns=["day", "mode", "route_id", "med_sec"])
+        rdm = rdm.rename(columns={"day": "rep_day"})
+        net_frames.append(network_percentiles(sets, rdm).assign(window=p.window_tag)
+                             [["day", "window", "service_set", "routes", "p25_min", "p50_min", "p75_min"]])
+
+        routes = sets[["day", "rep_day"]].merge(rdm, on="rep_day", how="inner")
+        routes["med_minutes"] = (routes["med_sec"] / 60.0).round(2)
+        route_frames.append(routes.assign(window=p.window_tag)
+                                  [["day", "window", "mode", "route_id", "med_minutes"]])
+
+    network = pd.concat(net_frames, ignore_index=True).sort_values(["window", "day"], kind="stable")
+    routes = (pd.concat(route_frames, ignore_index=True)
+                .sort_values(["window", "day", "mode", "route_id"], kind="stable"))
+    return network.reset_index(drop=True), routes.reset_index(drop=True)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Daily headway series over a feed's validity, deduplicated by timetable.")
+    ap.add_argument("--start", default=None, help="YYYY-MM-DD (default: first service date of the feed)")
+    ap.add_argument("--end", default=None, help="YYYY-MM-DD (default: last service date of the feed)")
+    ap.add_argument("--window", action="append", help="Hours, e.g. 7-10 (repeatable; default 7-10 and 16-19)")
+    ap.add_argument("--region", default="EL30")
+    ap.add_argument("--feed", default="")
+    ap.add_argument("--modes", default="", help="Comma-separated modes (bus,fixed); empty = all")
+    ap.add_argument("--out-network", default=NETWORK_OUT)
+    ap.add_argument("--out-routes", default=ROUTES_OUT)
+    ap.add_argument("--no-cache", action="store_true")
+    args = ap.parse_args()
+
+    params = QueryParams(region=args.region, feed=args.feed, modes=parse_list(args.modes))
+    kw = {"use_cache": not args.no_cache}
+    windows = [parse_window(w) for w in (args.window or ["7-10", "16-19"])]
+
+    first, last = feed_validity(params, **kw) if not (args.start and args.end) else (None, None)
+    start = dt.date.fromisoformat(args.start) if args.start else first
+    end = dt.date.fromisoformat(args.end) if args.end else last
+    if start > end:
+        raise SystemExit(f"empty range {start}..{end}")
+
+    network, routes = daily_series(params, start, end, windows, **kw)
+    for df, out in ((network, args.out_network), (routes, args.out_routes)):
+        Path(out).parent.mkdir(parents=True, exist_ok=True)
+        df.to_csv(out, index=False)
+        print(f"Saved {out} ({len(df):,} rows)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Event transport summary (docs/event_transport_summary.csv) as concurrent steps.
+
+Replaces sql/export_event_transport_summary_steps.sql, which ran S0–S5 one after
+another in a single psql session. Here every step declares the steps it needs and
+an asyncio runner starts it on its own pooled connection as soon as those are done:
+
+  stops     region stops (shared by every branch)
+  services  services on the fallback dates (shared by the fallback branches)
+  T3_all × {AM, PM}               needs stops
+  T3W_MULTI_fallback × {AM, PM}   needs stops, services
+
+Shared inputs are UNLOGGED tables in the outputs schema (session temp tables are
+invisible to the other connections), named per run and dropped at the end. The four
+network medians run side by side, so the summary takes about as long as the slowest
+branch. The medians are the network_median family (arrivals → per-stop headways →
+route/day medians → day medians → median across days) on the integer-keyed tables.
+
+Usage:
+  python -m src.queries.event_summary
+  python -m src.queries.event_summary --dates 2024-11-19,2024-11-20,2024-11-21 --out /tmp/summary.csv
+"""
+import time
+import uuid
+import asyncio
+import argparse
+from pathlib import Path
+from dataclasses import dataclass, field
+
+import pandas as pd
+import sqlalchemy as sa
+from dotenv import load_dotenv
+
+from src.config import get_engine
+from src.queries.runner import QueryParams, render_template, parse_dates
+
+OUT = Path("docs/event_transport_summary.csv")
+
+# Tue–Thu fallback dates of the event summary (Nov 19–28, 2024).
+FALLBACK_DATES = parse_dates("2024-11-19,2024-11-20,2024-11-21,2024-11-26,2024-11-27,2024-11-28")
+WINDOWS = {"AM": (7, 10), "PM": (16, 19)}
+
+_SETTINGS = ("SET LOCAL statement_timeout = '45min'", "SET LOCAL jit = off", "SET LOCAL work_mem = '256MB'")
+
+STOPS_SQL = """
+CREATE UNLOGGED TABLE {stops} AS
+SELECT s.mode, s.stop_key
+FROM {stops_geom} s
+JOIN meta.region r ON r.iso_code = :iso
+WHERE ST_Intersects(s.geom, r.geom);
+CREATE INDEX ON {stops} (mode, stop_key);
+ANALYZE {stops};
+"""
+
+SERVICES_SQL = """
+CREATE UNLOGGED TABLE {services} AS
+WITH
+{services_dated}
+SELECT mode, service_key, d FROM services_on_date;
+ANALYZE {services};
+"""
+
+MEDIAN_SQL = """
+WITH
+{services_cte},
+win AS (
+  SELECT sod.d, st.mode, tr.route_key, st.stop_key, st.arrival_sec AS sec
+  FROM services_on_date sod
+  JOIN {trips} tr ON tr.service_key=sod.service_key AND tr.mode=sod.mode
+  JOIN {stop_times} st ON st.trip_key=tr.trip_key AND st.mode=tr.mode
+  JOIN {stops} sa ON sa.stop_key=st.stop_key AND sa.mode=st.mode
+  WHERE st.arrival_sec IS NOT NULL AND (st.arrival_sec % 86400) BETWEEN :sec_start AND :sec_end - 1
+),
+{route_day_median},
+day_median AS (
+  SELECT d, percentile_cont(0.5) WITHIN GROUP (ORDER BY med_sec) AS day_med_sec
+  FROM route_day_median
+  GROUP BY d
+)
+SELECT ROUND(((percentile_cont(0.5) WITHIN GROUP (ORDER BY day_med_sec))/60.0)::numeric, 2) AS minutes
+FROM day_median
+WHERE day_med_sec IS NOT NULL
+"""
+
+
+@dataclass(frozen=True)
+class Step:
+    """
+    One unit of work on its own connection. Steps with `result` return the scalar
+    of their last statement; the others only create tables.
+    """
+    name: str
+    sql: str
+    binds: dict = field(default_factory=dict)
+    needs: tuple[str, ...] = ()
+    result: bool = False
+
+
+def _execute(eng, step: Step):
+    with eng.begin() as con:
+        for s in _SETTINGS:
+            con.exec_driver_sql(s)
+        *ddl, last = [s for s in step.sql.split(";") if s.strip()]
+        for s in ddl:
+            con.execute(sa.text(s), step.binds)
+        value = con.execute(sa.text(last), step.binds)
+        return value.scalar() if step.result else None
+
+
+async def run_steps(steps: list[Step], engine=None) -> dict[str, object]:
+    """
+    Run steps concurrently, each as soon as the steps it needs have finished, each
+    in a worker thread on a separate pooled connection. Returns {name: result}.
+    Raises the first failure after every started step has finished.
+    """
+    eng = engine or get_engine()
+    names = {s.name for s in steps}
+    for s in steps:
+        missing = set(s.needs) - names
+        if missing:
+            raise ValueError(f"step {s.name!r} needs unknown step(s) {sorted(missing)}")
+    tasks: dict[str, asyncio.Task] = {}
+    t0 = time.perf_counter()
+
+    async def one(step: Step):
+        # A failed dependency re-raises here, so dependents never start.
+        await asyncio.gather(*(tasks[n] for n in step.needs))
+        t = time.perf_counter()
+        value = await asyncio.to_thread(_execute, eng, step)
+        print(f"[ok] {step.name}: {time.perf_counter() - t:.1f}s (done at {time.perf_counter() - t0:.1f}s)")
+        return value
+
+    for s in steps:
+        tasks[s.name] = asyncio.create_task(one(s))
+    results = await asyncio.gather(*tasks.values(), return_exceptions=True)
+    for name, r in zip(tasks, results):
+        if isinstance(r, BaseException):
+            print(f"[fail] {name}: {r}")
+    for r in results:
+        if isinstance(r, BaseException):
+            raise r
+    return dict(zip(tasks, results))
+
+
+def plan(dates=FALLBACK_DATES, region: str = "EL30", feed: str = "",
+         run_id: str | None = None) -> tuple[list[Step], list[str]]:
+    """
+    Steps of the event summary and the scratch tables they create.
+    """
+    run_id = run_id or uuid.uuid4().hex[:8]
+    base = QueryParams(dates=tuple(dates), region=region, feed=feed)
+    ctx = base.tables()
+    ctx["stops"] = f"outputs.event_summary_stops_{run_id}"
+    ctx["services"] = f"outputs.event_summary_services_{run_id}"
+    ctx["services_dated"] = render_template("_services_dated", ctx).rstrip()
+    ctx["route_day_median"] = render_template("_route_day_median", ctx).rstrip()
+    binds = base.binds()
+
+    steps = [
+        Step("stops", STOPS_SQL.format(**ctx), {"iso": region}),
+        Step("services", SERVICES_SQL.format(**ctx), {"dates": binds["dates"]}),
+    ]
+    variants = {
+        "T3_all": (render_template("_services_all", ctx).rstrip(), ("stops",)),
+        "T3W_MULTI_fallback": (f"services_on_date AS (SELECT mode, service_key, d FROM {ctx['services']})",
+                               ("stops", "services")),
+    }
+    for variant, (services_cte, needs) in variants.items():
+        for window, (start, end) in WINDOWS.items():
+            sql = MEDIAN_SQL.format(services_cte=services_cte, **ctx)
+            steps.append(Step(f"{variant} {window}", sql, {"sec_start": start * 3600, "sec_end": end * 3600},
+                              needs, result=True))
+    return steps, [ctx["stops"], ctx["services"]]
+
+
+def summarize(dates=FALLBACK_DATES, region: str = "EL30", feed: str = "", engine=None) -> pd.DataFrame:
+    """
+    Compute the summary (window, variant, minutes), dropping the scratch tables afterwards.
+    """
+    eng = engine or get_engine()
+    steps, scratch = plan(dates, region, feed)
+    t0 = time.perf_counter()
+    try:
+        results = asyncio.run(run_steps(steps, eng))
+    finally:
+        with eng.begin() as con:
+            for t in scratch:
+                con.exec_driver_sql(f"DROP TABLE IF EXISTS {t}")
+    rows = []
+    for s in steps:
+        if s.result:
+            variant, window = s.name.split()
+            minutes = results[s.name]
+            rows.append({"window": window, "variant": variant,
+                         "minutes": None if minutes is None else float(minutes)})
+    print(f"Event summary: {len(steps)} steps in {time.perf_counter() - t0:.1f}s")
+    # Same row order as the psql export: window, then T3_all before the fallback.
+    return pd.DataFrame(rows).sort_values("window", kind="stable", ignore_index=True)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Event transport summary with concurrent steps.")
+    ap.add_argument("--dates", default=",".join(map(str, FALLBACK_DATES)), help="Fallback dates (YYYY-MM-DD, comma-separated)")
+    ap.add_argument("--region", default="EL30", help="meta.region iso_code")
+    ap.add_argument("--feed", default="", help="GTFS table suffix, e.g. _2024 for a pinned feed version")
+    ap.add_argument("--out", default=str(OUT))
+    args = ap.parse_args()
+
+    load_dotenv()
+    df = summarize(parse_dates(args.dates), region=args.region, feed=args.feed)
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    df.to_csv(out, index=False, float_format="%.2f")
+    print(df.to_string(index=False))
+    print(f"Saved {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Streaming exporter: runs a query through a named server-side cursor and writes
+the result batch by batch as CSV, Parquet or newline-delimited GeoJSON.
+
+Only one batch is held in memory at a time, so the footprint does not depend on
+the size of the result. Several exports run concurrently on separate pooled
+connections. This replaces the psql-only exports (\\copy ... TO '/tmp/...',
+\\o with one jsonb_agg FeatureCollection string).
+
+Usage:
+  python -m src.queries.export route_medians --window 16-19 --out docs/t3_route_medians_16_19.csv
+  python -m src.queries.export stop_medians --dates 2024-11-20 --out docs/attica_headways_2024-11-20.geojsonl
+  python -m src.queries.export --jobs exports.json --workers 4
+
+A jobs file is a JSON list of {"family", "out", "dates"?, "window"?, "region"?, "feed"?, "modes"?}.
+"""
+import csv
+import json
+import argparse
+from pathlib import Path
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import sqlalchemy as sa
+
+from src.config import get_engine
+from src.queries.runner import FAMILIES, QueryParams, render, parse_dates, parse_list, parse_window
+
+BATCH_SIZE = 50_000
+
+FORMATS = {
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".geojsonl": "geojsonl",
+    ".geojsons": "geojsonl",
+    ".ndjson": "geojsonl",
+}
+
+
+@dataclass(frozen=True)
+class ExportJob:
+    family: str
+    out: Path
+    params: QueryParams = QueryParams()
+    fmt: str | None = None
+
+    @property
+    def format(self) -> str:
+        return self.fmt or format_for(self.out)
+
+
+def format_for(out: Path) -> str:
+    try:
+        return FORMATS[out.suffix.lower()]
+    except KeyError:
+        raise ValueError(f"cannot infer export format from {out}; use one of {sorted(FORMATS)}")
+
+
+def iter_batches(sql: str, binds: dict, *, engine=None, batch_size: int = BATCH_SIZE):
+    """
+    Yield (columns, rows, type_oids) per batch; an empty result yields one batch
+    without rows so writers still see the columns. yield_per makes psycopg2 use a
+    named (server-side) cursor, so rows are fetched batch_size at a time. type_oids
+    are the Postgres type OIDs of the columns (None if the driver did not report them).
+    """
+    eng = engine or get_engine()
+    with eng.connect() as con:
+        result = con.execution_options(yield_per=batch_size).execute(sa.text(sql), binds)
+        columns = list(result.keys())
+        cur = result.cursor  # a named cursor only has a description after the first fetch
+        n = 0
+        for part in result.partitions():
+            yield columns, part, _type_oids(cur)
+            n += 1
+        if n == 0:
+            yield columns, [], _type_oids(cur)
+
+
+def _type_oids(cur) -> list[int] | None:
+    desc = getattr(cur, "description", None)
+    return [d[1] for d in desc] if desc else None
+
+
+class _CsvWriter:
+    def __init__(self, path: Path):
+        self.f = open(path, "w", newline="", encoding="utf-8")
+        self.w = csv.writer(self.f)
+        self.header = False
+
+    def write(self, columns, rows, types=None):
+        if not self.header:
+            self.w.writerow(columns)
+            self.header = True
+        self.w.writerows(rows)
+
+    def close(self):
+        self.f.close()
+
+
+class _ParquetWriter:
+    """
+    The file schema is fixed by the first batch: column types come from the Postgres
+    type OIDs where known, else from the first batch's values (all-null → string).
+    Every batch is cast to it, so a column that is null in one batch or numeric
+    (Decimal) in another still fits.
+    """
+    def __init__(self, path: Path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise SystemExit("Parquet export needs pyarrow (pip install pyarrow).") from e
+        self.pa, self.pq = pa, pq
+        self.path = path
+        self.writer = None
+        self.oid_types = {
+            16: pa.bool_(), 21: pa.int16(), 23: pa.int32(), 20: pa.int64(),
+            700: pa.float32(), 701: pa.float64(), 1700: pa.float64(),
+            25: pa.string(), 1043: pa.string(), 19: pa.string(), 1042: pa.string(),
+            1082: pa.date32(), 1114: pa.timestamp("us"), 1184: pa.timestamp("us", tz="UTC"),
+        }
+
+    def _schema(self, columns, arrays, types):
+        pa = self.pa
+        fields = []
+        for i, (c, a) in enumerate(zip(columns, arrays)):
+            t = self.oid_types.get(types[i]) if types else None
+            if t is None:
+                t = pa.string() if pa.types.is_null(a.type) else a.type
+            fields.append(pa.field(c, t))
+        return pa.schema(fields)
+
+    def write(self, columns, rows, types=None):
+        pa = self.pa
+        arrays = [pa.array([r[i] for r in rows]) for i in range(len(columns))]
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.path, self._schema(columns, arrays, types))
+        schema = self.writer.schema
+        arrays = [a if a.type == f.type else a.cast(f.type) for a, f in zip(arrays, schema)]
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        else:
+            # No batch at all (not even the column names): still leave a valid file.
+            self.pq.write_table(self.pa.table({}), self.path)
+
+
+class _GeoJsonLinesWriter:
+    """
+    One Feature per line. Geometry comes from a 'geometry' column holding
+    ST_AsGeoJSON text, or from 'lon'/'lat' columns; everything else is a property.
+    """
+    def __init__(self, path: Path):
+        self.f = open(path, "w", encoding="utf-8")
+
+    def write(self, columns, rows, types=None):
+        if "geometry" in columns:
+            gi = columns.index("geometry")
+            geom = lambda r: r[gi]
+            skip = {gi}
+        elif "lon" in columns and "lat" in columns:
+            xi, yi = columns.index("lon"), columns.index("lat")
+            geom = lambda r: json.dumps({"type": "Point", "coordinates": [r[xi], r[yi]]})
+            skip = {xi, yi}
+        else:
+            raise ValueError("GeoJSON export needs a 'geometry' column or 'lon'/'lat' columns")
+        props = [(i, c) for i, c in enumerate(columns) if i not in skip]
+        for r in rows:
+            p = json.dumps({c: r[i] for i, c in props}, ensure_ascii=False, default=float)
+            self.f.write(f'{{"type":"Feature","geometry":{geom(r)},"properties":{p}}}\n')
+
+    def close(self):
+        self.f.close()
+
+
+WRITERS = {"csv": _CsvWriter, "parquet": _ParquetWriter, "geojsonl": _GeoJsonLinesWriter}
+
+
+def write_batches(batches, out: Path, fmt: str | None = None) -> int:
+    """
+    Write an iterable of (columns, rows[, type_oids]) batches to <out>.part and
+    rename on success. Returns the number of rows written.
+    """
+    out = Path(out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_name(out.name + ".part")
+    writer = WRITERS[fmt or format_for(out)](tmp)
+    n = 0
+    try:
+        for columns, rows, *types in batches:
+            writer.write(columns, rows, *types)
+            n += len(rows)
+    finally:
+        writer.close()
+    tmp.replace(out)
+    return n
+
+
+def export(job: ExportJob, *, engine=None, batch_size: int = BATCH_SIZE) -> int:
+    """
+    Stream one job to disk. Returns the number of rows written.
+    """
+    sql, binds, _ = render(job.family, job.params)
+    n = write_batches(iter_batches(sql, binds, engine=engine, batch_size=batch_size),
+                      job.out, job.format)
+    print(f"[ok] {job.family} → {job.out} ({n:,} rows)")
+    return n
+
+
+def export_many(jobs: list[ExportJob], *, workers: int = 4, batch_size: int = BATCH_SIZE) -> dict[Path, int]:
+    """
+    Run several exports concurrently, one pooled connection each.
+    """
+    eng = get_engine()
+    out = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futs = {pool.submit(export, j, engine=eng, batch_size=batch_size): j for j in jobs}
+        for fut in as_completed(futs):
+            out[futs[fut].out] = fut.result()
+    return out
+
+
+def _job_from_dict(d: dict) -> ExportJob:
+    params = QueryParams(
+        dates=parse_dates(d.get("dates", "")),
+        window=parse_window(d.get("window", "7-10")),
+        region=d.get("region", "EL30"),
+        feed=d.get("feed", ""),
+        modes=parse_list(d.get("modes", "")),
+    )
+    return ExportJob(family=d["family"], out=Path(d["out"]), params=params, fmt=d.get("format"))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Stream query results to CSV / Parquet / GeoJSON lines.")
+    ap.add_argument("family", nargs="?", choices=FAMILIES)
+    ap.add_argument("--out", help="Output path; format from suffix (.csv, .parquet, .geojsonl)")
+    ap.add_argument("--dates", default="", help="Comma-separated YYYY-MM-DD; empty = all services")
+    ap.add_argument("--window", default="7-10", help="Hours, e.g. 7-10 or 16_19")
+    ap.add_argument("--region", default="EL30")
+    ap.add_argument("--feed", default="")
+    ap.add_argument("--modes", default="", help="Comma-separated modes (bus,fixed); empty = all")
+    ap.add_argument("--jobs", help="JSON file with a list of export jobs")
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = ap.parse_args()
+
+    if args.jobs:
+        jobs = [_job_from_dict(d) for d in json.loads(Path(args.jobs).read_text(encoding="utf-8"))]
+    elif args.family and args.out:
+        jobs = [_job_from_dict({"family": args.family, "out": args.out, "dates": args.dates,
+                                "window": args.window, "region": args.region, "feed": args.feed,
+                                "modes": args.modes})]
+    else:
+        raise SystemExit("Give a family with --out, or --jobs FILE.")
+
+    export_many(jobs, workers=args.workers, batch_size=args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
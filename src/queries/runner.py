@@ -0,0 +1,251 @@
+"""
+Parameterized runner for the SQL templates in sql/templates/.
+
+One template per query family replaces the hand-copied _param/_fix/_16_19/_copy/
+<date> variants under sql/. Dates, window and region are bound as query
+parameters; only table names (which depend on the feed suffix) are rendered
+into the text. Templates join the integer-keyed tables (raw.gtfs_*_k_all, mode
+as smallint) and decode route/stop/service ids from the dictionaries at the end.
+Results are cached on disk, keyed by the rendered SQL, the bound values and a
+fingerprint of every base table the query reads, so a repeated export or
+comparison returns without touching stop_times.
+
+Usage:
+  python -m src.queries.runner route_medians --window 16-19 --out docs/t3_route_medians_16_19.csv
+  python -m src.queries.runner route_medians --dates 2024-11-19,2024-11-20,2024-11-21 --window 16-19
+"""
+import re
+import json
+import hashlib
+import argparse
+import datetime as dt
+from pathlib import Path
+from dataclasses import dataclass
+
+import pandas as pd
+import sqlalchemy as sa
+
+from src.config import get_engine
+
+TEMPLATE_DIR = Path(__file__).resolve().parents[2] / "sql" / "templates"
+CACHE_DIR = Path("data/cache/sql")
+
+FAMILIES = ("route_medians", "day_percentiles", "network_median", "stop_medians", "route_lines",
+            "route_day_medians", "service_days", "service_fingerprints", "feed_validity",
+            "route_day_headways", "shape_points", "shape_trips")
+
+_TOKEN = re.compile(r"\{\{\s*(>\s*)?(\w+)\s*\}\}")
+_INPUTS = re.compile(r"^\s*--\s*inputs:\s*(.+)$", re.MULTILINE)
+_FEED = re.compile(r"^\w*$")
+
+
+@dataclass(frozen=True)
+class QueryParams:
+    """
+    Typed parameters shared by every template.
+    dates:  service dates; empty = all services (T3), one = T3W, several = T3W_MULTI
+    window: [start_hour, end_hour) of the headway window
+    region: meta.region.iso_code used for the stop filter
+    feed:   suffix appended to the raw GTFS table names; "_<version>" reads the views
+            `gtfs_store pin --version <version>` creates, "" the current feeds
+    modes:  restrict to these modes ("bus", "fixed"); empty = all
+    """
+    dates: tuple[dt.date, ...] = ()
+    window: tuple[int, int] = (7, 10)
+    region: str = "EL30"
+    feed: str = ""
+    modes: tuple[str, ...] = ()
+
+    def __post_init__(self):
+        if not _FEED.match(self.feed):
+            raise ValueError(f"feed suffix must be [A-Za-z0-9_]*, got {self.feed!r}")
+        start, end = self.window
+        if not 0 <= start < end <= 48:
+            raise ValueError(f"window must satisfy 0 <= start < end <= 48, got {self.window}")
+        object.__setattr__(self, "dates", tuple(sorted(set(self.dates))))
+        object.__setattr__(self, "modes", tuple(sorted(set(self.modes))))
+
+    @property
+    def window_tag(self) -> str:
+        return f"{self.window[0]:02d}_{self.window[1]:02d}"
+
+    def tables(self) -> dict[str, str]:
+        f = self.feed
+        return {
+            "stop_times":           f"raw.gtfs_stop_times_k_all{f}",
+            "trips":                f"raw.gtfs_trips_k_all{f}",
+            "stops_geom":           f"raw.gtfs_stops_k_all{f}",
+            "route_dict":           f"raw.gtfs_route_dict_all{f}",
+            "stop_dict":            f"raw.gtfs_stop_dict_all{f}",
+            "service_dict":         f"raw.gtfs_service_dict_all{f}",
+            "modes":                "raw.gtfs_mode",
+            "routes":               f"raw.gtfs_routes_all{f}",
+            "trips_bus":            f"raw.gtfs_trips_bus{f}",
+            "shapes_bus":           f"raw.gtfs_shapes_bus{f}",
+            "calendar_bus":         f"raw.gtfs_calendar_bus{f}",
+            "calendar_dates_bus":   f"raw.gtfs_calendar_dates_bus{f}",
+            "calendar_dates_fixed": f"raw.gtfs_calendar_dates_fixed{f}",
+        }
+
+    def binds(self) -> dict:
+        return {
+            "dates": list(self.dates),
+            "sec_start": self.window[0] * 3600,
+            "sec_end": self.window[1] * 3600,
+            "iso": self.region,
+            "modes": list(self.modes),
+        }
+
+
+def render_template(name: str, context: dict[str, str]) -> str:
+    """
+    Expand {{ident}} from context and {{> fragment}} from sql/templates/<fragment>.sql.
+    """
+    path = TEMPLATE_DIR / f"{name}.sql"
+    text = path.read_text(encoding="utf-8-sig")
+
+    def sub(m: re.Match) -> str:
+        if m.group(1):
+            return render_template(m.group(2), context).rstrip().rstrip(";")
+        key = m.group(2)
+        if key not in context:
+            raise KeyError(f"{path.name}: no value for {{{{{key}}}}}")
+        return context[key]
+
+    return _TOKEN.sub(sub, text)
+
+
+def render(family: str, params: QueryParams) -> tuple[str, dict, list[str]]:
+    """
+    Return (sql, binds, input_relations) for a query family.
+    Only the binds that actually occur in the rendered SQL are returned.
+    """
+    if family not in FAMILIES:
+        raise ValueError(f"unknown query family {family!r}; expected one of {FAMILIES}")
+    context = params.tables()
+    services = "_services_dated" if params.dates else "_services_all"
+    context["services"] = render_template(services, context).rstrip()
+    context["mode_filter"] = (f"AND s.mode = ANY(ARRAY(SELECT mode FROM {context['modes']} "
+                              f"WHERE mode_name = ANY(CAST(:modes AS text[]))))" if params.modes else "")
+    sql = render_template(family, context)
+
+    binds = {k: v for k, v in params.binds().items()
+             if re.search(rf"(?<![:\w]):{k}\b", sql)}
+    inputs = sorted({rel.strip() for line in _INPUTS.findall(sql)
+                     for rel in line.split(",") if rel.strip()})
+    return sql, binds, inputs
+
+
+# Base tables behind each input (views and partitioned parents are expanded), with
+# their storage file and write counters. Any reload, TRUNCATE or DML changes the row.
+_FINGERPRINT_SQL = sa.text("""
+    WITH RECURSIVE edges(parent, child) AS (
+      SELECT r.ev_class, d.refobjid
+      FROM pg_rewrite r
+      JOIN pg_depend d ON d.classid='pg_rewrite'::regclass AND d.objid=r.oid
+                      AND d.refclassid='pg_class'::regclass AND d.refobjid<>r.ev_class
+      UNION ALL
+      SELECT inhparent, inhrelid FROM pg_inherits
+    ), deps(oid) AS (
+      SELECT to_regclass(:rel)::oid
+      UNION
+      SELECT e.child FROM deps JOIN edges e ON e.parent=deps.oid
+    )
+    SELECT c.oid::regclass::text AS rel,
+           pg_relation_filenode(c.oid) AS filenode,
+           coalesce(s.n_tup_ins,0) AS ins, coalesce(s.n_tup_upd,0) AS upd,
+           coalesce(s.n_tup_del,0) AS del
+    FROM deps
+    JOIN pg_class c ON c.oid=deps.oid
+    LEFT JOIN pg_stat_all_tables s ON s.relid=c.oid
+    WHERE c.relkind IN ('r','m')
+    ORDER BY 1
+""")
+
+
+def table_fingerprints(con, relations: list[str]) -> dict[str, list]:
+    out = {}
+    for rel in relations:
+        rows = con.execute(_FINGERPRINT_SQL, {"rel": rel}).fetchall()
+        out[rel] = [list(r) for r in rows]
+    return out
+
+
+def cache_key(sql: str, binds: dict, fingerprints: dict) -> str:
+    payload = json.dumps({"sql": sql, "binds": binds, "tables": fingerprints},
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def run(family: str, params: QueryParams | None = None, *, engine=None,
+        use_cache: bool = True, cache_dir: Path = CACHE_DIR) -> pd.DataFrame:
+    """
+    Render and execute a query family through the pooled engine, with result caching.
+    """
+    params = params or QueryParams()
+    sql, binds, inputs = render(family, params)
+    eng = engine or get_engine()
+
+    with eng.connect() as con:
+        key = cache_key(sql, binds, table_fingerprints(con, inputs))
+        path = Path(cache_dir) / f"{family}-{key[:20]}.pkl"
+        if use_cache and path.exists():
+            print(f"[cache] {family} {params.window_tag} ({len(params.dates)} dates) → {path}")
+            return pd.read_pickle(path)
+        df = pd.read_sql(sa.text(sql), con, params=binds)
+
+    if use_cache:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        df.to_pickle(tmp)
+        tmp.replace(path)
+    print(f"[ok] {family} {params.window_tag} ({len(params.dates)} dates): {len(df):,} rows")
+    return df
+
+
+def parse_dates(s: str) -> tuple[dt.date, ...]:
+    return tuple(dt.date.fromisoformat(x.strip()) for x in s.split(",") if x.strip())
+
+
+def parse_list(s: str) -> tuple[str, ...]:
+    return tuple(x.strip() for x in s.split(",") if x.strip())
+
+
+def parse_window(s: str) -> tuple[int, int]:
+    start, end = re.split(r"[-_:]", s.strip())
+    return int(start), int(end)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Run a parameterized SQL template (with result cache).")
+    ap.add_argument("family", choices=FAMILIES)
+    ap.add_argument("--dates", default="", help="Comma-separated YYYY-MM-DD; empty = all services")
+    ap.add_argument("--window", default="7-10", help="Hours, e.g. 7-10 or 16_19")
+    ap.add_argument("--region", default="EL30", help="meta.region iso_code")
+    ap.add_argument("--feed", default="", help="GTFS table suffix, e.g. _2024 for a pinned feed version")
+    ap.add_argument("--modes", default="", help="Comma-separated modes (bus,fixed); empty = all")
+    ap.add_argument("--out", default=None, help="CSV path (default: print)")
+    ap.add_argument("--no-cache", action="store_true")
+    ap.add_argument("--show-sql", action="store_true", help="Print rendered SQL and exit")
+    args = ap.parse_args()
+
+    params = QueryParams(dates=parse_dates(args.dates), window=parse_window(args.window),
+                         region=args.region, feed=args.feed, modes=parse_list(args.modes))
+    if args.show_sql:
+        sql, binds, inputs = render(args.family, params)
+        print(sql)
+        print("-- binds:", binds)
+        print("-- inputs:", inputs)
+        return
+
+    df = run(args.family, params, use_cache=not args.no_cache)
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        df.to_csv(args.out, index=False)
+        print(f"Saved {args.out}")
+    else:
+        print(df.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""
+Mergeable quantile sketches of route headways per (date, window, route).
+
+One scan of stop_times (route_day_headways: histogram of headways per day and
+route) gives, for every route-day, the exact median (percentile_cont, as in
+route_day_medians) and a DDSketch with relative error ALPHA: headway h goes to
+bucket ceil(log_gamma h), gamma = (1 + alpha) / (1 - alpha), and any quantile
+read from the bucket counts is within ±alpha of the true value. Sketches with the
+same alpha merge by adding bucket counts, so p25/p50/p75 for any combination of
+dates, windows, modes or routes come from a few hundred integers per route-day
+instead of re-sorting every headway.
+
+Rows live in outputs.headway_sketch, keyed by the input-table state (runner
+fingerprints), region, feed and alpha; only (date, window) pairs not yet stored
+for the current state are computed. outputs.headway_sketch_state holds the current
+state per (region, feed); when it changes (e.g. a GTFS reload), the rows of the
+old state are deleted.
+
+The percentiles pool the headways of all route-days in a group: --by network
+p50 is the median of every headway in the network, not T3's median of route
+medians (daily_series, network_median). The exact route-day medians are stored
+as med_sec for that.
+
+Usage:
+  python -m src.queries.sketches --dates 2024-11-19,2024-11-20,2024-11-21 --window 7-10 --window 16-19
+  python -m src.queries.sketches --dates 2024-11-19,2024-11-20 --window 7-10 --by route --modes bus --out q.csv
+"""
+import math
+import argparse
+import datetime as dt
+from pathlib import Path
+from dataclasses import dataclass, field, replace
+
+import numpy as np
+import pandas as pd
+import sqlalchemy as sa
+
+from src.config import get_engine
+from src.queries.runner import QueryParams, render, run, table_fingerprints, cache_key, \
+    parse_dates, parse_list, parse_window
+
+ALPHA = 0.01
+QUANTILES = (0.25, 0.5, 0.75)
+BY = {"network": [], "mode": ["mode"], "route": ["mode", "route_id"], "day": ["day"],
+      "window": ["win"], "day_window": ["day", "win"]}
+
+DDL = """
+CREATE TABLE IF NOT EXISTS outputs.headway_sketch (
+  state     text NOT NULL,             -- input-table state, region and feed
+  alpha     double precision NOT NULL, -- relative error bound of the sketch
+  win       text NOT NULL,             -- window tag, e.g. 07_10
+  day       date NOT NULL,
+  mode      text NOT NULL,
+  route_id  text NOT NULL,
+  n         bigint NOT NULL,           -- headways in the sketch
+  med_sec   double precision NOT NULL, -- exact route-day median (percentile_cont)
+  keys      int4[] NOT NULL,           -- DDSketch bucket indexes, ascending
+  counts    int8[] NOT NULL,
+  PRIMARY KEY (state, alpha, win, day, mode, route_id)
+);
+-- (day, window) pairs already sketched for a state, including days without service.
+CREATE TABLE IF NOT EXISTS outputs.headway_sketch_done (
+  state text NOT NULL,
+  alpha double precision NOT NULL,
+  win   text NOT NULL,
+  day   date NOT NULL,
+  PRIMARY KEY (state, alpha, win, day)
+);
+-- Current state per region and feed; rows of any other state for them are stale.
+CREATE TABLE IF NOT EXISTS outputs.headway_sketch_state (
+  region text NOT NULL,
+  feed   text NOT NULL,
+  state  text NOT NULL,
+  PRIMARY KEY (region, feed)
+);
+"""
+
+
+@dataclass
+class DDSketch:
+    """
+    Relative-error quantile sketch over positive values (DDSketch, unbounded buckets).
+    Headways are at most 3600 s, so a sketch has at most log_gamma(3600) buckets
+    (~410 at alpha = 0.01).
+    """
+    alpha: float = ALPHA
+    counts: dict[int, int] = field(default_factory=dict)
+
+    @property
+    def gamma(self) -> float:
+        return (1 + self.alpha) / (1 - self.alpha)
+
+    def key(self, values) -> np.ndarray:
+        return np.ceil(np.log(np.asarray(values, dtype=float)) / math.log(self.gamma)).astype(np.int32)
+
+    def value(self, key: int) -> float:
+        # Midpoint (in relative terms) of (gamma^(k-1), gamma^k]
+        return 2.0 * self.gamma ** key / (self.gamma + 1)
+
+    def add(self, values, weights=None) -> "DDSketch":
+        keys = self.key(values)
+        weights = np.ones(len(keys), dtype=np.int64) if weights is None else np.asarray(weights, dtype=np.int64)
+        for k, w in zip(*_sum_by_key(keys, weights)):
+            self.counts[int(k)] = self.counts.get(int(k), 0) + int(w)
+        return self
+
+    def merge(self, other: "DDSketch") -> "DDSketch":
+        if other.alpha != self.alpha:
+            raise ValueError(f"cannot merge sketches with alpha {self.alpha} and {other.alpha}")
+        for k, w in other.counts.items():
+            self.counts[k] = self.counts.get(k, 0) + w
+        return self
+
+    @property
+    def n(self) -> int:
+        return sum(self.counts.values())
+
+    def quantile(self, q: float) -> float | None:
+        keys = sorted(self.counts)
+        return _quantile_sorted(np.array(keys), np.array([self.counts[k] for k in keys]), q, self.value)
+
+    def to_arrays(self) -> tuple[list[int], list[int]]:
+        keys = sorted(self.counts)
+        return keys, [self.counts[k] for k in keys]
+
+    @classmethod
+    def from_arrays(cls, keys, counts, alpha: float = ALPHA) -> "DDSketch":
+        return cls(alpha, {int(k): int(c) for k, c in zip(keys, counts)})
+
+
+def _sum_by_key(keys: np.ndarray, weights: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    uniq, inv = np.unique(keys, return_inverse=True)
+    return uniq, np.bincount(inv, weights=weights).astype(np.int64)
+
+
+def _quantile_sorted(keys: np.ndarray, counts: np.ndarray, q: float, value) -> float | None:
+    """
+    Lower nearest-rank quantile at rank q*(n-1) over sorted bucket keys.
+    """
+    n = int(counts.sum())
+    if n == 0:
+        return None
+    rank = q * (n - 1)
+    i = int(np.searchsorted(np.cumsum(counts), rank, side="right"))
+    return value(int(keys[min(i, len(keys) - 1)]))
+
+
+def exact_quantile(values: np.ndarray, counts: np.ndarray, q: float) -> float:
+    """
+    percentile_cont(q) of a histogram (values ascending): linear interpolation
+    between the order statistics around position q*(n-1).
+    """
+    cum = np.cumsum(counts)
+    pos = q * (cum[-1] - 1)
+    lo, hi = math.floor(pos), math.ceil(pos)
+    v_lo = values[np.searchsorted(cum, lo, side="right")]
+    v_hi = values[np.searchsorted(cum, hi, side="right")]
+    return float(v_lo + (v_hi - v_lo) * (pos - lo))
+
+
+def sketch_state(params: QueryParams, *, engine=None) -> str:
+    """
+    Key of the current input state: rendered headway SQL (dates and window are
+    binds, so they do not enter), region, feed and the fingerprints of its inputs.
+    """
+    eng = engine or get_engine()
+    p = replace(params, dates=(dt.date(2000, 1, 1),), modes=())
+    sql, binds, inputs = render("route_day_headways", p)
+    with eng.connect() as con:
+        fp = table_fingerprints(con, inputs)
+    return cache_key(sql, {"iso": params.region, "feed": params.feed}, fp)
+
+
+def sketch_histogram(hist: pd.DataFrame, alpha: float) -> pd.DataFrame:
+    """
+    route_day_headways rows → one row per (day, mode, route_id) with n, exact
+    med_sec and the DDSketch as ascending keys / counts.
+    """
+    sk = DDSketch(alpha)
+    rows = []
+    for (day, mode, route_id), g in hist.groupby(["day", "mode", "route_id"], sort=True):
+        dh = g["dh"].to_numpy()
+        n = g["n"].to_numpy(dtype=np.int64)
+        order = np.argsort(dh, kind="stable")
+        dh, n = dh[order], n[order]
+        keys, counts = _sum_by_key(sk.key(dh), n)
+        rows.append((day, mode, route_id, int(n.sum()), exact_quantile(dh, n, 0.5),
+                     keys.tolist(), counts.tolist()))
+    return pd.DataFrame(rows, columns=["day", "mode", "route_id", "n", "med_sec", "keys", "counts"])
+
+
+def prune(params: QueryParams, state: str, *, engine=None) -> None:
+    """
+    Record `state` as current for the region and feed and delete the sketches of
+    the state it replaces.
+    """
+    eng = engine or get_engine()
+    key = {"r": params.region, "f": params.feed, "s": state}
+    with eng.begin() as con:
+        old = con.execute(sa.text(
+            "SELECT state FROM outputs.headway_sketch_state WHERE region=:r AND feed=:f FOR UPDATE"),
+            key).scalar()
+        if old == state:
+            return
+        if old is not None:
+            n = con.execute(sa.text("DELETE FROM outputs.headway_sketch WHERE state=:o"), {"o": old}).rowcount
+            con.execute(sa.text("DELETE FROM outputs.headway_sketch_done WHERE state=:o"), {"o": old})
+            print(f"[ok] sketches: inputs changed, dropped {n:,} route-days of the previous state")
+        con.execute(sa.text("""
+            INSERT INTO outputs.headway_sketch_state (region, feed, state) VALUES (:r, :f, :s)
+            ON CONFLICT (region, feed) DO UPDATE SET state = EXCLUDED.state"""), key)
+
+
+def build(params: QueryParams, dates, windows, alpha: float = ALPHA, *, engine=None,
+          use_cache: bool = True) -> str:
+    """
+    Make sure sketches exist for every (date, window) under the current input state.
+    Returns the state key.
+    """
+    eng = engine or get_engine()
+    with eng.begin() as con:
+        con.exec_driver_sql(DDL)
+    state = sketch_state(params, engine=eng)
+    prune(params, state, engine=eng)
+    dates = sorted(set(dates))
+    for window in windows:
+        tag = replace(params, window=window).window_tag
+        with eng.connect() as con:
+            done = {r[0] for r in con.execute(sa.text(
+                "SELECT day FROM outputs.headway_sketch_done WHERE state=:s AND alpha=:a AND win=:w"),
+                {"s": state, "a": alpha, "w": tag})}
+        todo = [d for d in dates if d not in done]
+        if not todo:
+            print(f"[cache] sketches {tag}: {len(dates)} dates")
+            continue
+        hist = run("route_day_headways", replace(params, dates=tuple(todo), window=window, modes=()),
+                   engine=eng, use_cache=use_cache)
+        sk = sketch_histogram(hist, alpha)
+        records = [{"state": state, "alpha": alpha, "win": tag, **r} for r in sk.to_dict("records")]
+        with eng.begin() as con:
+            if records:
+                con.execute(sa.text("""
+                    INSERT INTO outputs.headway_sketch
+                      (state, alpha, win, day, mode, route_id, n, med_sec, keys, counts)
+                    VALUES (:state, :alpha, :win, CAST(:day AS date), :mode, :route_id, :n, :med_sec,
+                            :keys, :counts)
+                    ON CONFLICT DO NOTHING"""), records)
+            con.execute(sa.text("""
+                INSERT INTO outputs.headway_sketch_done (state, alpha, win, day)
+                VALUES (:s, :a, :w, :d) ON CONFLICT DO NOTHING"""),
+                [{"s": state, "a": alpha, "w": tag, "d": d} for d in todo])
+        print(f"[ok] sketches {tag}: {len(todo)} new dates, {len(sk):,} route-days")
+    return state
+
+
+def load_sketches(state: str, dates, windows: list[str], modes=(), alpha: float = ALPHA, *,
+                  engine=None) -> pd.DataFrame:
+    eng = engine or get_engine()
+    sql = sa.text("""
+        SELECT to_char(day,'YYYY-MM-DD') AS day, win, mode, route_id, n, med_sec, keys, counts
+        FROM outputs.headway_sketch
+        WHERE state=:s AND alpha=:a AND win = ANY(:w) AND day = ANY(CAST(:d AS date[]))
+          AND (cardinality(CAST(:m AS text[])) = 0 OR mode = ANY(CAST(:m AS text[])))
+    """)
+    with eng.connect() as con:
+        return pd.read_sql(sql, con, params={"s": state, "a": alpha, "w": list(windows),
+                                             "d": list(dates), "m": list(modes)})
+
+
+def merge_quantiles(sketches: pd.DataFrame, by: list[str], qs=QUANTILES, alpha: float = ALPHA) -> pd.DataFrame:
+    """
+    Merge the sketches within each `by` group and read the quantiles (minutes).
+    """
+    value = DDSketch(alpha).value
+    cols = [f"p{round(q * 100):02d}_min" for q in qs]
+    if sketches.empty:
+        return pd.DataFrame(columns=by + ["route_days", "n"] + cols)
+    long = (sketches[by + ["keys", "counts"]]
+            .explode(["keys", "counts"])
+            .astype({"keys": "int64", "counts": "int64"}))
+    merged = long.groupby(by + ["keys"], sort=True)["counts"].sum().reset_index()
+
+    def quantiles(g: pd.DataFrame) -> pd.Series:
+        k, c = g["keys"].to_numpy(), g["counts"].to_numpy()
+        return pd.Series({col: round(_quantile_sorted(k, c, q, value) / 60.0, 2) for col, q in zip(cols, qs)})
+
+    grouped = merged.groupby(by, sort=True) if by else [((), merged)]
+    out = pd.DataFrame([{**dict(zip(by, key if isinstance(key, tuple) else (key,))), **quantiles(g)}
+                        for key, g in grouped])
+    sizes = (sketches.groupby(by).agg(route_days=("n", "size"), n=("n", "sum")).reset_index() if by else
+             pd.DataFrame({"route_days": [len(sketches)], "n": [sketches["n"].sum()]}))
+    out = sizes.merge(out, on=by) if by else pd.concat([sizes, out], axis=1)
+    return out[by + ["route_days", "n"] + cols]
+
+
+def percentiles(params: QueryParams, dates, windows, by: str = "network", qs=QUANTILES,
+                alpha: float = ALPHA, *, engine=None, use_cache: bool = True) -> pd.DataFrame:
+    """
+    p25/p50/p75 (default) of headways over any dates × windows × params.modes,
+    grouped by network / mode / route / day / window / day_window. Quantiles are
+    over the pooled headways of each group, not medians of route medians.
+    """
+    eng = engine or get_engine()
+    state = build(params, dates, windows, alpha, engine=eng, use_cache=use_cache)
+    tags = [replace(params, window=w).window_tag for w in windows]
+    sk = load_sketches(state, dates, tags, params.modes, alpha, engine=eng)
+    return merge_quantiles(sk, BY[by], qs, alpha)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Headway percentiles for any dates × windows × modes from stored sketches.")
+    ap.add_argument("--dates", required=True, help="Comma-separated YYYY-MM-DD")
+    ap.add_argument("--window", action="append", help="Hours, e.g. 7-10 (repeatable; default 7-10)")
+    ap.add_argument("--modes", default="", help="Comma-separated modes (bus,fixed); empty = all")
+    ap.add_argument("--by", choices=sorted(BY), default="network")
+    ap.add_argument("--alpha", type=float, default=ALPHA, help="Relative error bound (default 0.01)")
+    ap.add_argument("--region", default="EL30")
+    ap.add_argument("--feed", default="")
+    ap.add_argument("--out", default=None, help="CSV path (default: print)")
+    ap.add_argument("--no-cache", action="store_true")
+    args = ap.parse_args()
+
+    if not 0 < args.alpha < 1:
+        raise SystemExit("--alpha must be in (0, 1)")
+    params = QueryParams(region=args.region, feed=args.feed, modes=parse_list(args.modes))
+    windows = [parse_window(w) for w in (args.window or ["7-10"])]
+    df = percentiles(params, parse_dates(args.dates), windows, by=args.by, alpha=args.alpha,
+                     use_cache=not args.no_cache)
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        df.to_csv(args.out, index=False)
+        print(f"Saved {args.out}")
+    else:
+        print(df.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
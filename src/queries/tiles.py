@@ -0,0 +1,278 @@
+"""
+Mapbox vector tiles (MVT) of stop- and route-level headways, pre-rendered into
+an on-disk tile cache.
+
+For one (dates, window, modes) combination the stop and route medians are
+materialized once into outputs.headway_tile_stop / outputs.headway_tile_route
+(EPSG:3857, GIST-indexed). Every tile over the region bbox is then cut with
+ST_TileEnvelope + ST_AsMVTGeom + ST_AsMVT on parallel pooled connections and
+written to data/tiles/<layer>/{z}/{x}/{y}.pbf. Existing tiles are not
+re-rendered unless the stop minzoom differs from the one in the layer's
+tilejson.json, and the layer directory name carries a fingerprint of the input
+tables, so a feed reload starts a fresh layer instead of serving stale tiles.
+
+Usage:
+  python -m src.queries.tiles --dates 2024-11-20 --window 7-10 --modes bus --zooms 8-14
+  python -m src.queries.tiles --dates 2024-11-19,2024-11-20,2024-11-21 --each-date --window 16-19
+"""
+import json
+import math
+import argparse
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import sqlalchemy as sa
+
+from src.config import get_engine
+from src.queries.runner import (
+    QueryParams, render, table_fingerprints, cache_key,
+    parse_dates, parse_list, parse_window,
+)
+
+TILE_DIR = Path("data/tiles")
+EXTENT = 4096
+BUFFER = 64
+STOP_MINZOOM = 12
+WORLD_M = 40075016.68557849  # EPSG:3857 world width
+
+DDL = """
+CREATE TABLE IF NOT EXISTS outputs.headway_tile_layer (
+  layer_key   TEXT PRIMARY KEY,
+  params      JSONB,
+  created_at  TIMESTAMPTZ DEFAULT now()
+);
+CREATE UNLOGGED TABLE IF NOT EXISTS outputs.headway_tile_stop (
+  layer_key   TEXT NOT NULL,
+  stop_id     TEXT,
+  mode        TEXT,
+  med_min     DOUBLE PRECISION,
+  geom        GEOMETRY(Point, 3857)
+);
+CREATE UNLOGGED TABLE IF NOT EXISTS outputs.headway_tile_route (
+  layer_key         TEXT NOT NULL,
+  route_id          TEXT,
+  mode              TEXT,
+  route_short_name  TEXT,
+  med_min           DOUBLE PRECISION,
+  geom              GEOMETRY(LineString, 3857)
+);
+CREATE INDEX IF NOT EXISTS idx_headway_tile_stop_key  ON outputs.headway_tile_stop(layer_key);
+CREATE INDEX IF NOT EXISTS idx_headway_tile_stop_geom ON outputs.headway_tile_stop USING GIST (geom);
+CREATE INDEX IF NOT EXISTS idx_headway_tile_route_key  ON outputs.headway_tile_route(layer_key);
+CREATE INDEX IF NOT EXISTS idx_headway_tile_route_geom ON outputs.headway_tile_route USING GIST (geom);
+"""
+
+TILE_SQL = sa.text("""
+    WITH b AS (
+      SELECT ST_TileEnvelope(:z, :x, :y) AS env,
+             ST_Expand(ST_TileEnvelope(:z, :x, :y), :pad) AS env_pad
+    ),
+    routes AS (
+      SELECT t.route_id, t.mode, t.route_short_name, t.med_min,
+             ST_AsMVTGeom(ST_Simplify(t.geom, :tol), b.env, :extent, :buffer, true) AS geom
+      FROM outputs.headway_tile_route t, b
+      WHERE t.layer_key = :k AND t.geom && b.env_pad
+    ),
+    stops AS (
+      SELECT t.stop_id, t.mode, t.med_min,
+             ST_AsMVTGeom(t.geom, b.env, :extent, :buffer, true) AS geom
+      FROM outputs.headway_tile_stop t, b
+      WHERE t.layer_key = :k AND :z >= :stop_minzoom AND t.geom && b.env_pad
+    )
+    SELECT coalesce((SELECT ST_AsMVT(r.*, 'routes', :extent, 'geom') FROM routes r WHERE r.geom IS NOT NULL), ''::bytea)
+        || coalesce((SELECT ST_AsMVT(s.*, 'stops',  :extent, 'geom') FROM stops  s WHERE s.geom IS NOT NULL), ''::bytea)
+""")
+
+
+def layer_name(params: QueryParams, key: str) -> str:
+    if not params.dates:
+        dates = "all"
+    elif len(params.dates) == 1:
+        dates = params.dates[0].strftime("%Y%m%d")
+    else:
+        dates = f"{params.dates[0]:%Y%m%d}-{params.dates[-1]:%Y%m%d}_n{len(params.dates)}"
+    modes = "+".join(params.modes) or "all"
+    return f"{dates}_{params.window_tag}_{modes}-{key[:10]}"
+
+
+def materialize_layer(params: QueryParams, *, engine=None) -> tuple[str, str]:
+    """
+    Fill the tile source tables for params (once per input state).
+    Returns (layer_key, layer_name).
+    """
+    eng = engine or get_engine()
+    stop_sql, stop_binds, stop_inputs = render("stop_medians", params)
+    route_sql, route_binds, route_inputs = render("route_medians", params)
+    line_sql, line_binds, line_inputs = render("route_lines", params)
+    binds = {**stop_binds, **route_binds, **line_binds}
+
+    with eng.begin() as con:
+        con.exec_driver_sql(DDL)
+        fp = table_fingerprints(con, sorted(set(stop_inputs + route_inputs + line_inputs)))
+        key = cache_key(stop_sql + route_sql + line_sql, binds, fp)
+        name = layer_name(params, key)
+        # Serialize concurrent builders of the same layer
+        con.execute(sa.text("SELECT pg_advisory_xact_lock(hashtext(:k))"), {"k": key})
+        done = con.execute(sa.text(
+            "SELECT 1 FROM outputs.headway_tile_layer WHERE layer_key=:k"), {"k": key}).first()
+        if done:
+            print(f"[cache] tile layer {name}")
+            return key, name
+
+        con.execute(sa.text(f"""
+            INSERT INTO outputs.headway_tile_stop (layer_key, stop_id, mode, med_min, geom)
+            SELECT :layer_key, q.stop_id, q.mode, q.med_min,
+                   ST_Transform(ST_SetSRID(ST_MakePoint(q.lon, q.lat), 4326), 3857)
+            FROM (
+{stop_sql}
+            ) q
+        """), {**stop_binds, "layer_key": key})
+        con.execute(sa.text(f"""
+            INSERT INTO outputs.headway_tile_route (layer_key, route_id, mode, route_short_name, med_min, geom)
+            SELECT :layer_key, m.route_id, m.mode, m.route_short_name, m.med_minutes::double precision,
+                   ST_Transform(ST_SetSRID(ST_GeomFromGeoJSON(l.geometry), 4326), 3857)
+            FROM (
+{route_sql}
+            ) m
+            JOIN (
+{line_sql}
+            ) l ON l.mode=m.mode AND l.route_id=m.route_id
+        """), {**route_binds, **line_binds, "layer_key": key})
+        con.execute(sa.text(
+            "INSERT INTO outputs.headway_tile_layer (layer_key, params) VALUES (:k, CAST(:p AS jsonb))"),
+            {"k": key, "p": json.dumps(_params_json(params))})
+    print(f"[ok] tile layer {name} materialized")
+    return key, name
+
+
+def _params_json(params: QueryParams) -> dict:
+    return {
+        "dates": [d.isoformat() for d in params.dates],
+        "window": list(params.window),
+        "region": params.region,
+        "feed": params.feed,
+        "modes": list(params.modes),
+    }
+
+
+def lonlat_to_tile(lon: float, lat: float, z: int) -> tuple[int, int]:
+    n = 2 ** z
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def region_tiles(region: str, zooms: range, *, engine=None) -> list[tuple[int, int, int]]:
+    eng = engine or get_engine()
+    with eng.connect() as con:
+        w, s, e, n = con.execute(sa.text("""
+            SELECT ST_XMin(ext), ST_YMin(ext), ST_XMax(ext), ST_YMax(ext)
+            FROM (SELECT ST_Extent(geom) AS ext FROM meta.region WHERE iso_code=:iso) q
+        """), {"iso": region}).one()
+    out = []
+    for z in zooms:
+        x0, y0 = lonlat_to_tile(w, n, z)
+        x1, y1 = lonlat_to_tile(e, s, z)
+        out.extend((z, x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1))
+    return out
+
+
+def render_tile(key: str, z: int, x: int, y: int, out: Path, *, engine=None,
+                stop_minzoom: int = STOP_MINZOOM) -> int:
+    eng = engine or get_engine()
+    tile_m = WORLD_M / (2 ** z)
+    binds = {
+        "k": key, "z": z, "x": x, "y": y,
+        "extent": EXTENT, "buffer": BUFFER,
+        "pad": tile_m * BUFFER / EXTENT,
+        "tol": tile_m / EXTENT,
+        "stop_minzoom": stop_minzoom,
+    }
+    with eng.connect() as con:
+        data = bytes(con.execute(TILE_SQL, binds).scalar_one())
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_suffix(".tmp")
+    tmp.write_bytes(data)  # empty tiles are cached too (zero bytes)
+    tmp.replace(out)
+    return len(data)
+
+
+def _stop_minzoom(root: Path) -> int | None:
+    """
+    Stop-layer minzoom recorded in a layer's tilejson.json, or None if there is none.
+    """
+    path = root / "tilejson.json"
+    if not path.exists():
+        return None
+    layers = json.loads(path.read_text(encoding="utf-8")).get("vector_layers", [])
+    return next((l.get("minzoom") for l in layers if l.get("id") == "stops"), None)
+
+
+def build_tiles(params: QueryParams, zooms: range, *, workers: int = 8, force: bool = False,
+                tile_dir: Path = TILE_DIR, stop_minzoom: int = STOP_MINZOOM) -> Path:
+    eng = get_engine()
+    key, name = materialize_layer(params, engine=eng)
+    root = Path(tile_dir) / name
+    stored = _stop_minzoom(root)
+    if stored is not None and stored != stop_minzoom and not force:
+        # stop_minzoom is not part of the tile path: tiles cut with the old one are stale.
+        print(f"[tiles] {name}: stop minzoom {stored} → {stop_minzoom}, re-rendering all tiles")
+        force = True
+    tiles = region_tiles(params.region, zooms, engine=eng)
+    todo = [(z, x, y) for z, x, y in tiles
+            if force or not (root / str(z) / str(x) / f"{y}.pbf").exists()]
+    print(f"[tiles] {name}: {len(tiles):,} tiles over z{zooms.start}-{zooms.stop - 1}, {len(todo):,} to render")
+
+    tilejson = {
+        "tilejson": "3.0.0",
+        "name": name,
+        "tiles": ["{z}/{x}/{y}.pbf"],
+        "minzoom": zooms.start,
+        "maxzoom": zooms.stop - 1,
+        "vector_layers": [
+            {"id": "routes", "fields": {"route_id": "String", "mode": "String",
+                                        "route_short_name": "String", "med_min": "Number"}},
+            {"id": "stops", "minzoom": stop_minzoom,
+             "fields": {"stop_id": "String", "mode": "String", "med_min": "Number"}},
+        ],
+        "params": _params_json(params),
+    }
+    root.mkdir(parents=True, exist_ok=True)
+    # Written before rendering, so an interrupted run still records the stop minzoom of its tiles.
+    (root / "tilejson.json").write_text(json.dumps(tilejson, indent=2), encoding="utf-8")
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        sizes = list(pool.map(
+            lambda t: render_tile(key, *t, root / str(t[0]) / str(t[1]) / f"{t[2]}.pbf",
+                                  engine=eng, stop_minzoom=stop_minzoom),
+            todo))
+    print(f"[ok] {name}: rendered {len(sizes):,} tiles ({sum(sizes) / 1e6:.1f} MB) → {root}")
+    return root
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Pre-render headway vector tiles (MVT) into a tile cache.")
+    ap.add_argument("--dates", default="", help="Comma-separated YYYY-MM-DD; empty = all services")
+    ap.add_argument("--each-date", action="store_true", help="One layer per date instead of a multi-day layer")
+    ap.add_argument("--window", default="7-10", help="Hours, e.g. 7-10 or 16_19")
+    ap.add_argument("--modes", default="", help="Comma-separated modes (bus,fixed); empty = all")
+    ap.add_argument("--region", default="EL30")
+    ap.add_argument("--feed", default="")
+    ap.add_argument("--zooms", default="8-14", help="Zoom range, inclusive, e.g. 8-14")
+    ap.add_argument("--stop-minzoom", type=int, default=STOP_MINZOOM)
+    ap.add_argument("--workers", type=int, default=8)
+    ap.add_argument("--force", action="store_true", help="Re-render tiles already in the cache")
+    args = ap.parse_args()
+
+    zmin, zmax = parse_window(args.zooms)
+    dates = parse_dates(args.dates)
+    date_sets = [(d,) for d in dates] if args.each_date and dates else [dates]
+    for ds in date_sets:
+        params = QueryParams(dates=ds, window=parse_window(args.window), region=args.region,
+                             feed=args.feed, modes=parse_list(args.modes))
+        build_tiles(params, range(zmin, zmax + 1), workers=args.workers, force=args.force,
+                    stop_minzoom=args.stop_minzoom)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import datetime as dt
+
+import pandas as pd
+
+from src.queries import daily_series as daily_series_mod
+from src.queries.daily_series import network_percentiles
+from src.queries.runner import QueryParams
+
+SETS = pd.DataFrame({"day": ["2024-06-11", "2024-06-12"], "service_set": ["", "abc"],
+                     "rep_day": ["2024-06-11", "2024-06-12"]})
+
+
+def test_no_route_medians():
+    # Dates outside the feed or a window without arrivals: nothing to compute.
+    for rdm in (pd.DataFrame(columns=["rep_day", "mode", "route_id", "med_sec"]),
+                pd.DataFrame({"rep_day": pd.Series(dtype=str), "med_sec": pd.Series(dtype=float)})):
+        net = network_percentiles(SETS, rdm)
+        assert net["routes"].tolist() == [0, 0]
+        assert net[["p25_min", "p50_min", "p75_min"]].isna().all().all()
+
+
+def test_percentiles():
+    rdm = pd.DataFrame({"rep_day": ["2024-06-12"] * 3, "med_sec": [300.0, 600.0, 900.0]})
+    net = network_percentiles(SETS, rdm)
+    assert net["routes"].tolist() == [0, 3]
+    assert net.loc[1, ["p25_min", "p50_min", "p75_min"]].tolist() == [7.5, 10.0, 12.5]
+    assert net.loc[0, ["p50_min"]].isna().all()
+
+
+def test_no_active_services(monkeypatch):
+    # Range outside the feed: service_days is empty, every day is "" and has no medians.
+    frames = {
+        "service_days": pd.DataFrame({"day": pd.Series(dtype=str), "mode": pd.Series(dtype=str),
+                                      "service_id": pd.Series(dtype=str)}),
+        "service_fingerprints": pd.DataFrame({"mode": ["bus"], "service_id": ["wk"], "fingerprint": ["f1"]}),
+    }
+    calls = []
+
+    def run(family, params, **kw):
+        calls.append(family)
+        return frames[family].copy()
+
+    monkeypatch.setattr(daily_series_mod, "run", run)
+    network, routes = daily_series_mod.daily_series(QueryParams(), dt.date(2030, 1, 1), dt.date(2030, 1, 3),
+                                                    [(7, 10)])
+    assert "route_day_medians" not in calls
+    assert network["day"].tolist() == ["2030-01-01", "2030-01-02", "2030-01-03"]
+    assert network["service_set"].tolist() == ["", "", ""]
+    assert network["routes"].tolist() == [0, 0, 0]
+    assert network["p50_min"].isna().all()
+    assert routes.empty